@@ -0,0 +1,110 @@
+from collections import namedtuple
+
+import numpy as np
+
+from noughtsandcrosses import (NoughtsAndCrossesBoard,
+                               TableNoughtsAndCrossesPlayer)
+
+
+def solve(board=None, values=None, positions=None):
+    """
+    Find the game-theoretic value (+1 X wins, 0 draw, -1 O wins) of every
+    position reachable from board (the empty board by default) by a memoised
+    minimax search. Returns a dictionary of values and a dictionary of boards,
+    both keyed on position code.
+    """
+    if board is None:
+        board = NoughtsAndCrossesBoard()
+    if values is None:
+        values = dict()
+    if positions is None:
+        positions = dict()
+
+    code = board.code
+    if code in values:
+        return values, positions
+    positions[code] = board
+
+    if board.over:
+        values[code] = board.winner
+    else:
+        child_values = []
+        for mv in board.permitted_moves:
+            bd = board.copy()
+            bd.move(mv)
+            solve(bd, values, positions)
+            child_values.append(values[bd.code])
+        values[code] = board.turn*max(board.turn*v for v in child_values)
+
+    return values, positions
+
+
+class PolicyReport(namedtuple('PolicyReport', ['positions', 'blunders'])):
+    """
+    Result of an exhaustive policy evaluation. positions and blunders are
+    arrays indexed by depth (the number of marks on the board).
+    """
+    @property
+    def blunder_rate(self):
+        """
+        Fraction of all positions in which the policy blundered.
+        """
+        return np.sum(self.blunders)/max(np.sum(self.positions), 1)
+
+    @property
+    def blunder_rate_by_depth(self):
+        """
+        Fraction of positions in which the policy blundered at each depth.
+        """
+        return self.blunders/np.maximum(self.positions, 1)
+
+def evaluate_policy(player, side=1, values=None, positions=None):
+    """
+    Query a player's policy on every reachable, unfinished position in which
+    side (+1 for X, -1 for O) is to move, and count the blunders: moves after
+    which the game-theoretic value is worse for the mover than before.
+    Positions are passed to the player's choose_moves method in one batch.
+    """
+    if (values is None) or (positions is None):
+        values, positions = solve()
+
+    codes = [code for code, bd in positions.items()
+                                        if (not bd.over) and (bd.turn == side)]
+    boards = [positions[code] for code in codes]
+    moves = player.choose_moves(boards)
+
+    num_positions = np.zeros(10, dtype=int)
+    num_blunders = np.zeros(10, dtype=int)
+    for code, board, mv in zip(codes, boards, moves):
+        depth = np.sum(board.state != 0)
+        bd = board.copy()
+        bd.move(mv)
+        num_positions[depth] += 1
+        if side*values[bd.code] < side*values[code]:
+            num_blunders[depth] += 1
+
+    return PolicyReport(num_positions, num_blunders)
+
+def compile_policy(player, name=None, positions=None):
+    """
+    Compile a learning player into a TableNoughtsAndCrossesPlayer by asking
+    it for its move, and the estimated value of that move, on every
+    reachable, unfinished position at once.
+    """
+    if positions is None:
+        _, positions = solve()
+    if name is None:
+        name = player.name
+
+    boards = [bd for bd in positions.values() if not bd.over]
+    moves = player.choose_moves(boards)
+    move_values = player.afterstate_values(boards, moves)
+
+    table_moves = -np.ones(NoughtsAndCrossesBoard.num_codes, dtype=np.int8)
+    table_values = np.full(NoughtsAndCrossesBoard.num_codes, np.nan,
+                           dtype=np.float32)
+    for board, mv, val in zip(boards, moves, move_values):
+        table_moves[board.code] = mv
+        table_values[board.code] = val
+
+    return TableNoughtsAndCrossesPlayer(name, table_moves, table_values)
@@ -1,11 +1,52 @@
 from abc import ABCMeta, abstractmethod
-from collections import namedtuple, deque
+from collections import namedtuple, deque, OrderedDict
+from types import MappingProxyType
 import string
 import random
+import threading
+import time
 
 import numpy as np
-import scipy as sp
-import scipy.misc as spmisc
+
+from events import EventBus
+from telemetry import Telemetry
+
+
+def make_rng(random_state=None):
+    """
+    Make a numpy Generator from a seed or SeedSequence. A Generator is
+    returned unchanged, and None gives fresh entropy.
+    """
+    return np.random.default_rng(random_state)
+
+def make_seed_sequence(random_state=None):
+    """
+    Make a numpy SeedSequence from a seed. A SeedSequence is returned
+    unchanged, and None gives fresh entropy.
+    """
+    if isinstance(random_state, np.random.SeedSequence):
+        return random_state
+    return np.random.SeedSequence(random_state)
+
+def spawn_rngs(random_state, num):
+    """
+    Make num independent child Generators from a seed or SeedSequence, e.g.
+    one for each game of a match. The streams depend only on the seed and
+    the child's index, so results do not depend on how games are shared out
+    between workers.
+    """
+    seeds = make_seed_sequence(random_state).spawn(num)
+    return [np.random.default_rng(seq) for seq in seeds]
+
+def logsumexp(x, axis=None, keepdims=False):
+    """
+    Numerically stable log(sum(exp(x))), as in scipy.special.logsumexp.
+    """
+    x_max = np.max(x, axis=axis, keepdims=True)
+    out = np.log(np.sum(np.exp(x - x_max), axis=axis, keepdims=True)) + x_max
+    if not keepdims:
+        out = np.squeeze(out, axis=axis)
+    return out
 
 
 class BoardgameError(ValueError):
@@ -23,9 +64,20 @@ class Boardgame:
     game_name = "Abstract Game"
     _player_limit = None
 
-    def __init__(self, verbosity=1):
+    def __init__(self, verbosity=1, event_bus=None, rng=None):
         self._generate_id()
         self.verbosity = verbosity
+        self.rng = make_rng(rng)
+        self._setup_events(event_bus)
+
+    def _setup_events(self, event_bus):
+        """
+        Use a shared event bus (to which observers may subscribe), or a
+        private one for this game.
+        """
+        if event_bus is None:
+            event_bus = EventBus()
+        self.event_bus = event_bus
 
     def _generate_id(self):
         """
@@ -41,12 +93,12 @@ class Boardgame:
         if (v <= self.verbosity):
             print('\n'+message+'\n')
 
-    def _notify(self, event, info=None):
+    def _publish(self, event_type, *args):
         """
-        A simple mechanism for notifying players of game events.
+        Publish a game event, if anyone (player or observer) is listening.
         """
-        for plyr in self.players:
-            plyr.notify(event, info)
+        if self.event_bus.has_subscribers(event_type):
+            self.event_bus.publish(event_type(self.game_id, *args))
 
     def add_players(self, players):
         """
@@ -62,12 +114,17 @@ class Boardgame:
                 raise BoardgameError("Player {} is already in the game".format(
                     plyr.name))
             plyr.connect(self.game_id)
+            plyr.session(self.game_id).rng = self.rng
+            for event_type, handler in plyr.event_handlers.items():
+                self.event_bus.subscribe(event_type, getattr(plyr, handler),
+                                         self.game_id)
             self.players.append(plyr)
     
     def remove_players(self):
         """
         Remove players
         """
+        self.event_bus.unsubscribe_game(self.game_id)
         for plyr in self.players:
             plyr.disconnect(self.game_id)
         self.players = []
@@ -79,52 +136,498 @@ class Boardgame:
         """
         pass
 
+class ZobristHashing:
+    """
+    Mixin which maintains a 64-bit Zobrist hash of a board, updated
+    incrementally as pieces are placed and removed, so that positions can be
+    used as dictionary keys in constant time.
+
+    Boards using it should set zobrist_shape to (number of cells, number of
+    piece types), call _zobrist_reset when the board is created or cleared,
+    and call _zobrist_toggle whenever a piece is placed or removed and
+    _zobrist_toggle_turn whenever the side to move changes. If symmetry_maps
+    (an array of cell permutations, identity first, with the transformed
+    state given by state[symmetry_maps[k]]) is set, a hash of each symmetric
+    image is maintained too, and canonical_hash is the same for all of them.
+    """
+    zobrist_shape = None
+    symmetry_maps = None
+    _zobrist_seed = 20160314
+
+    @classmethod
+    def _zobrist_keys(cls):
+        """
+        Random keys for each cell and piece, and for the side to move. These
+        are generated once per class from a fixed seed, so that hashes agree
+        between processes.
+        """
+        if '_zobrist_table' not in cls.__dict__:
+            num_cells, num_pieces = cls.zobrist_shape
+            rng = np.random.RandomState(cls._zobrist_seed)
+            keys = rng.randint(0, 2**64, size=num_cells*num_pieces+1,
+                               dtype=np.uint64).tolist()
+            if cls.symmetry_maps is None:
+                inverse_maps = [list(range(num_cells))]
+            else:
+                inverse_maps = np.argsort(cls.symmetry_maps, axis=1).tolist()
+            cls._zobrist_table = ([keys[cc*num_pieces:(cc+1)*num_pieces]
+                                        for cc in range(num_cells)],
+                                  keys[-1], inverse_maps)
+        return cls._zobrist_table
+
+    def _zobrist_reset(self):
+        """
+        Set the hashes to those of an empty board.
+        """
+        _, _, inverse_maps = self._zobrist_keys()
+        self._zobrist = [0]*len(inverse_maps)
+
+    def _zobrist_toggle(self, cell, piece):
+        """
+        Place or remove a piece on a cell.
+        """
+        table, _, inverse_maps = self._zobrist_keys()
+        hashes = self._zobrist
+        for kk in range(len(hashes)):
+            hashes[kk] ^= table[inverse_maps[kk][cell]][piece]
+
+    def _zobrist_toggle_turn(self):
+        """
+        Change the side to move.
+        """
+        _, turn_key, _ = self._zobrist_keys()
+        hashes = self._zobrist
+        for kk in range(len(hashes)):
+            hashes[kk] ^= turn_key
+
+    @property
+    def zobrist_hash(self):
+        """
+        64-bit hash of the position.
+        """
+        return self._zobrist[0]
+
+    @property
+    def canonical_hash(self):
+        """
+        64-bit hash of the position which is the same for all its symmetric
+        images.
+        """
+        return min(self._zobrist)
+
+def _freeze(value):
+    """
+    Read-only version of an attribute value: arrays become read-only views,
+    and lists and dictionaries become tuples and mapping proxies (with their
+    contents frozen too).
+    """
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(vv) for vv in value)
+    if isinstance(value, dict):
+        return MappingProxyType(dict((kk, _freeze(vv))
+                                     for kk, vv in value.items()))
+    return value
+
+class BoardSnapshot:
+    """
+    Read-only view of a board, handed to players in place of a copy so that
+    no copy is made unless the player needs one. Public attributes and
+    properties read through to the board, with arrays as read-only views
+    and the board's own lists and dictionaries frozen. The first time the
+    player calls one of mutating_methods, sets an attribute or touches a
+    private member, the snapshot takes a private copy of the board and works
+    on that from then on (copy-on-write), so the game's board is never
+    changed. copy gives an ordinary mutable board.
+
+    Until it has been copied, a snapshot follows the game's board, so it is
+    only valid for the move it was handed over for. Players which keep
+    boards between moves should copy them.
+    """
+    mutating_methods = ("move", "unmove")
+
+    def __init__(self, board):
+        """
+        Wrap a board.
+        """
+        object.__setattr__(self, "_board", board)
+        object.__setattr__(self, "_owned", False)
+
+    def _make_own(self):
+        """
+        Switch to a private copy of the board, if not done already.
+        """
+        if not self._owned:
+            object.__setattr__(self, "_board", self._board.copy())
+            object.__setattr__(self, "_owned", True)
+        return self._board
+
+    def __getattr__(self, name):
+        if self._owned:
+            return getattr(self._board, name)
+        if name.startswith("_") or (name in self.mutating_methods):
+            return getattr(self._make_own(), name)
+        value = getattr(self._board, name)
+        if isinstance(value, np.ndarray):
+            return _freeze(value)
+        if name in self._board.__dict__:
+            return _freeze(value)
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self._make_own(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._make_own(), name)
+
+    def __reduce__(self):
+        return (BoardSnapshot, (self._board,))
+
+    def copy(self):
+        """
+        Copy the board, as a mutable board.
+        """
+        return self._board.copy()
+
+    @property
+    def owned(self):
+        """
+        Whether the snapshot has taken its own copy of the board.
+        """
+        return self._owned
+
+class PlayerSession:
+    """
+    Per-game state for a player. Anything a player needs to remember during
+    a game should be kept on its session rather than on the player, so that
+    one player (and one model) can take part in many games at once. The game
+    sets rng to its own random number generator, which players should use
+    for any random decisions during the game.
+    """
+    def __init__(self, game_id):
+        """
+        Create the session.
+        """
+        self.game_id = game_id
+        self.rng = None
+
 class Player:
     __metaclass__ = ABCMeta
     """
-    Abstract player class.
+    Abstract player class. A player holds only what is shared between games;
+    per-game state lives in a PlayerSession, one for each game the player is
+    connected to, which is passed to move.
+
+    Players that want to hear about game events list them in event_handlers,
+    mapping event types (see events.py) to the names of handler methods,
+    which are called with the event.
     """
-    _current_game_id = None
+    event_handlers = {}
 
-    def __init__(self, name):
+    def __init__(self, name, rng=None):
         """
-        Create the player.
+        Create the player. rng (a seed or numpy Generator) is used for random
+        decisions made outside of a game. Subclasses which override this must
+        call it, so that the player has its sessions from the start.
         """
         self.name = name
+        self.rng = make_rng(rng)
+        self._sessions = dict()
+
+    def _rng(self, session):
+        """
+        The random number generator to use: the game's, if in a game.
+        """
+        if (session is not None) and (session.rng is not None):
+            return session.rng
+        return self.rng
+
+    @property
+    def sessions(self):
+        """
+        Sessions for the games the player is connected to, keyed by game ID.
+        """
+        return self._sessions
+
+    def new_session(self, game_id):
+        """
+        Create the per-game state for a new game.
+        """
+        return PlayerSession(game_id)
+
+    def session(self, game_id):
+        """
+        Get the session for a game.
+        """
+        return self.sessions[game_id]
     
     def connect(self, game_id):
         """
         Connect player to a game.
         """
-        if self._current_game_id is None:
-            self._current_game_id = game_id
-        else:
-            raise BoardgameError("Player {} is already"
-                                 " playing a game.".format(self.name))
+        if game_id in self.sessions:
+            raise BoardgameError("Player {} is already playing game "
+                                 "{}.".format(self.name, game_id))
+        self.sessions[game_id] = self.new_session(game_id)
 
     def disconnect(self, game_id, feedback=None):
         """
         Disconnect from a game
         """
-        if self._current_game_id is game_id:
-            self._current_game_id = None
+        self.sessions.pop(game_id, None)
 
-    def notify(self, event, info):
+    @abstractmethod
+    def move(self, board, session=None):
         """
-        Act on an event notification from the game.
+        Make a move.
+        """
+        pass
+
+    def interrupt(self, session=None):
+        """
+        Called when the time allowed for a move has run out. Anytime players
+        should return the best move found so far; others return None.
+        """
+        return None
+
+    def choose_moves(self, boards):
+        """
+        Choose a move for each of a list of boards, outside of any game.
+        Players which can evaluate many positions at once should override
+        this with a batched implementation.
+        """
+        return [self.move(BoardSnapshot(board)) for board in boards]
+
+
+
+Layer = namedtuple('Layer', ['weight', 'bias'])
+
+class Optimiser:
+    __metaclass__ = ABCMeta
+    """
+    Abstract optimiser class. BoardgameNeuralNet delegates its training
+    update to an optimiser, which holds any state (e.g. velocities) in arrays
+    allocated once by initialise and updated in place by step. The step size
+    may be an array with one entry per net for a StackedNeuralNet.
+    """
+    def __init__(self, step_size=1E-1):
+        """
+        Create the optimiser.
+        """
+        self.step_size = step_size
+
+    def initialise(self, layers):
+        """
+        Allocate optimiser state for a list of layers.
         """
         pass
 
     @abstractmethod
-    def move(self, state):
+    def step(self, layers, gradients):
         """
-        Make a move.
+        Update the layer parameters in place given their gradients.
         """
         pass
 
+    @staticmethod
+    def _broadcast(value, param):
+        """
+        Shape a per-net value (e.g. step size) to broadcast against a
+        parameter whose leading axis indexes the nets. Scalars pass through.
+        """
+        if np.ndim(value) == 0:
+            return value
+        value = np.asarray(value)
+        return value.reshape(value.shape + (1,)*(param.ndim - value.ndim))
 
+    @staticmethod
+    def _zeros_like(layers):
+        """
+        Allocate a list of zero layers matching the shape of some layers.
+        """
+        return [Layer(np.zeros_like(layer.weight), np.zeros_like(layer.bias))
+                                                        for layer in layers]
+
+class SGDOptimiser(Optimiser):
+    """
+    Plain stochastic gradient descent.
+    """
+    def step(self, layers, gradients):
+        """
+        Update the layer parameters in place given their gradients.
+        """
+        for layer, grad in zip(layers, gradients):
+            for param, dparam in zip(layer, grad):
+                param -= self._broadcast(self.step_size, param)*dparam
+
+class MomentumOptimiser(Optimiser):
+    """
+    Stochastic gradient descent with (optionally Nesterov) momentum.
+    """
+    def __init__(self, step_size=1E-1, momentum=0.9, nesterov=False):
+        """
+        Create the optimiser.
+        """
+        self.step_size = step_size
+        self.momentum = momentum
+        self.nesterov = nesterov
+        self.velocity = None
+
+    def initialise(self, layers):
+        """
+        Allocate a velocity for every parameter.
+        """
+        self.velocity = self._zeros_like(layers)
+
+    def step(self, layers, gradients):
+        """
+        Update the layer parameters in place given their gradients.
+        """
+        if self.velocity is None:
+            self.initialise(layers)
+        for layer, grad, vel in zip(layers, gradients, self.velocity):
+            for param, dparam, v in zip(layer, grad, vel):
+                step_size = self._broadcast(self.step_size, param)
+                v *= self.momentum
+                v -= step_size*dparam
+                if self.nesterov:
+                    # Look-ahead form: param += mu*v - step_size*dparam
+                    param += self.momentum*v
+                    param -= step_size*dparam
+                else:
+                    param += v
+
+class NesterovOptimiser(MomentumOptimiser):
+    """
+    Stochastic gradient descent with Nesterov momentum.
+    """
+    def __init__(self, step_size=1E-1, momentum=0.9):
+        """
+        Create the optimiser.
+        """
+        MomentumOptimiser.__init__(self, step_size, momentum, nesterov=True)
+
+class AdamOptimiser(Optimiser):
+    """
+    Adam optimiser (Kingma and Ba, 2015).
+    """
+    def __init__(self, step_size=1E-3, beta1=0.9, beta2=0.999, epsilon=1E-8):
+        """
+        Create the optimiser.
+        """
+        self.step_size = step_size
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+        self.num_steps = 0
+        self.first_moment = None
+        self.second_moment = None
+        self._scratch = None
+
+    def initialise(self, layers):
+        """
+        Allocate moment estimates and a scratch buffer for every parameter.
+        """
+        self.num_steps = 0
+        self.first_moment = self._zeros_like(layers)
+        self.second_moment = self._zeros_like(layers)
+        self._scratch = self._zeros_like(layers)
+
+    def step(self, layers, gradients):
+        """
+        Update the layer parameters in place given their gradients.
+        """
+        if self.first_moment is None:
+            self.initialise(layers)
+        self.num_steps += 1
+        step_size = self.step_size * np.sqrt(1-self.beta2**self.num_steps) \
+                                        / (1-self.beta1**self.num_steps)
+        for layer, grad, mom1, mom2, scr in zip(layers, gradients,
+                                                self.first_moment,
+                                                self.second_moment,
+                                                self._scratch):
+            for param, dparam, m, v, s in zip(layer, grad, mom1, mom2, scr):
+                m *= self.beta1
+                m += (1-self.beta1)*dparam
+                np.multiply(dparam, dparam, out=s)
+                v *= self.beta2
+                s *= (1-self.beta2)
+                v += s
+                np.sqrt(v, out=s)
+                s += self.epsilon
+                np.divide(m, s, out=s)
+                s *= self._broadcast(step_size, param)
+                param -= s
+
+
+class ValueCache:
+    """
+    Bounded least-recently-used cache of net outputs, keyed on position
+    code. Entries are stamped with the version of the weights (and anything
+    else the outputs depend on) they were computed with. A lookup with a
+    new stamp empties the cache first, so values never go stale. Safe to
+    share between threads.
+    """
+    def __init__(self, max_size=10000):
+        """
+        Create an empty cache.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def lookup(self, stamp, keys):
+        """
+        List of the cached values for keys, with None for those missing.
+        """
+        with self._lock:
+            if stamp != self._stamp:
+                self._entries.clear()
+                self._stamp = stamp
+            values = []
+            for key in keys:
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                values.append(value)
+            return values
+
+    def store(self, stamp, keys, values):
+        """
+        Add values computed with stamp, evicting the least recently used
+        entries beyond max_size. Values computed with an out-of-date stamp
+        are dropped.
+        """
+        with self._lock:
+            if stamp != self._stamp:
+                return
+            for key, value in zip(keys, values):
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
 
-Layer = namedtuple('Layer', ['weight', 'bias'])
 
 class BoardgameNeuralNet:
     """
@@ -132,6 +635,22 @@ class BoardgameNeuralNet:
     hidden layers and units can be adjusted. The output has three elements
     with a soft-max nonlinearity, and represents the probabilities of
     win/draw/lose. Input and hidden layers use ReLU nonlinearity.
+
+    If symmetry_maps (an SxD array of input permutations, including the
+    identity, as on the board classes) is given, the net is invariant under
+    them: every input is replaced by a canonical representative of its
+    symmetry class before it reaches the first layer, so the training data
+    need not be augmented with symmetric copies.
+
+    If num_policy_outputs is set, a policy head is added alongside the
+    win/draw/lose head: a soft-max over that many moves (e.g. one per cell)
+    from the last hidden layer, masked to the legal moves. It is read with
+    predict_policy and trained by passing policy targets to update. The head
+    is held as the last entry of layers.
+
+    Each update records the cost, gradient norm and update time in
+    telemetry (a telemetry.Telemetry, by default a new in-memory one), and
+    increments version, so that cached predictions can be invalidated.
     """
     def __init__(self,
                  random_state=None,
@@ -140,9 +659,16 @@ class BoardgameNeuralNet:
                  num_hidden_units=[100],
                  step_size=1E-1,
                  regulariser=1E-4,
+                 optimiser=None,
+                 symmetry_maps=None,
+                 telemetry=None,
+                 num_policy_outputs=0,
                  ):
         """
-        Initialise the net.
+        Initialise the net. Training updates are delegated to optimiser,
+        which defaults to plain SGD with the given step_size. The weights are
+        drawn using random_state (a seed or numpy Generator), leaving the
+        global numpy random state alone.
         """
         if (len(num_hidden_units) != num_hidden_layers):
             raise ValueError("Must specify the number of hidden units"
@@ -151,11 +677,20 @@ class BoardgameNeuralNet:
         self.num_inputs = num_inputs
         self.num_hidden_layers = num_hidden_layers
         self.num_hidden_units = num_hidden_units
-        self.step_size = step_size
         self.regulariser = regulariser
+        if symmetry_maps is not None:
+            symmetry_maps = np.asarray(symmetry_maps)
+            # Column k ranks the image of an input under symmetry k
+            powers = 3.0**np.arange(num_inputs-1, -1, -1)
+            self._symmetry_keys = np.zeros((num_inputs, len(symmetry_maps)))
+            for kk, sym in enumerate(symmetry_maps):
+                self._symmetry_keys[sym,kk] = powers
+        self.symmetry_maps = symmetry_maps
+        if optimiser is None:
+            optimiser = SGDOptimiser(step_size)
+        self.optimiser = optimiser
 
-        if random_state is not None:
-            np.random.seed(seed=random_state)
+        self.rng = make_rng(random_state)
 
         self.layers = []
 
@@ -165,17 +700,143 @@ class BoardgameNeuralNet:
             self.layers.append(self.initialise_layer(num_hidden_units[ii],
                                                     num_hidden_units[ii+1]))
         self.layers.append(self.initialise_layer(num_hidden_units[-1], 3))        
+        self.num_policy_outputs = num_policy_outputs
+        if num_policy_outputs:
+            self.layers.append(self.initialise_layer(num_hidden_units[-1],
+                                                     num_policy_outputs))
+        self.optimiser.initialise(self.layers)
+
+        if telemetry is None:
+            telemetry = Telemetry()
+        self.telemetry = telemetry
+        self.version = 0
+
+    @property
+    def cost_sequence(self):
+        """
+        Downsampled history of the training cost over the whole run.
+        """
+        if "cost" not in self.telemetry:
+            return np.zeros(0)
+        return self.telemetry.history("cost")[1]
+
+    @property
+    def step_size(self):
+        """
+        Step size of the optimiser.
+        """
+        return self.optimiser.step_size
 
-        self.cost_sequence = []
+    @step_size.setter
+    def step_size(self, value):
+        self.optimiser.step_size = value
 
     def initialise_layer(self, num_in, num_out):
         """
         Randomly initialise weights and biases for a layer
         """
-        weight = np.random.randn(num_in, num_out)/np.sqrt(num_in)
+        weight = self.rng.standard_normal((num_in, num_out))/np.sqrt(num_in)
         bias = np.zeros(num_out)
         return Layer(weight, bias)
         
+    def canonicalise(self, X):
+        """
+        Replace each row of X by the greatest of its images under
+        symmetry_maps, ranked by a dot product with descending powers of
+        three. For inputs taking three evenly spaced values, such as scaled
+        board states, this is lexicographic order and so exactly invariant.
+        """
+        maps = self._canonical_maps(X)
+        if maps is None:
+            return X
+        return np.take_along_axis(X, maps, axis=1)
+
+    def _canonical_maps(self, X):
+        """
+        The symmetry map which canonicalise applies to each row of X, or None
+        if the net has no symmetries. Cell j of a canonical row is cell
+        maps[j] of the original.
+        """
+        if self.symmetry_maps is None:
+            return None
+        keys = np.dot(X, self._symmetry_keys)
+        return self.symmetry_maps[np.argmax(keys, axis=1)]
+
+    def _policy_logits(self, X, mask):
+        """
+        Propagate inputs (already canonical) through the hidden layers and
+        the policy head, returning the pre-activation output of each hidden
+        layer, the last hidden layer's output and the masked log
+        probabilities.
+        """
+        hidden_inputs = []
+        pre_activation = []
+        output = X
+        for ii in range(self.num_hidden_layers):
+            hidden_inputs.append(output)
+            output = np.dot(output, self.layers[ii].weight) \
+                                                    + self.layers[ii].bias
+            pre_activation.append(output)
+            output = np.maximum(0, output)
+        head = self.layers[-1]
+        logits = np.dot(output, head.weight) + head.bias
+        if mask is not None:
+            logits = np.where(mask, logits, -np.inf)
+        log_prob = logits - logsumexp(logits, axis=1, keepdims=True)
+        return hidden_inputs, pre_activation, output, log_prob
+
+    def predict_policy(self, X, mask=None):
+        """
+        Log probabilities of the policy head over moves for a NxD array of
+        inputs. mask is an optional NxP boolean array of the legal moves;
+        the rest get log probability -inf.
+        """
+        if not self.num_policy_outputs:
+            raise ValueError("This net has no policy head.")
+        maps = self._canonical_maps(X)
+        if maps is not None:
+            X = np.take_along_axis(X, maps, axis=1)
+            if mask is not None:
+                mask = np.take_along_axis(mask, maps, axis=1)
+        log_prob = self._policy_logits(X, mask)[3]
+        if maps is not None:
+            # Move canonical cell j back to original cell maps[j]
+            canonical, log_prob = log_prob, np.empty_like(log_prob)
+            np.put_along_axis(log_prob, maps, canonical, axis=1)
+        return log_prob
+
+    def _policy_gradients(self, X, targets, mask, weight):
+        """
+        Cost and parameter gradients of the policy loss (cross-entropy of
+        the targets under the masked policy, times weight), for every layer
+        except the win/draw/lose output.
+        """
+        M = X.shape[0]
+        maps = self._canonical_maps(X)
+        if maps is not None:
+            X = np.take_along_axis(X, maps, axis=1)
+            if mask is not None:
+                mask = np.take_along_axis(mask, maps, axis=1)
+            targets = np.argmax(maps == np.asarray(targets)[:,None], axis=1)
+        hidden_inputs, pre_activation, hidden, log_prob = \
+                                            self._policy_logits(X, mask)
+        cost = -weight*np.sum(log_prob[range(M), targets])/M
+
+        d_logits = np.exp(log_prob)
+        d_logits[range(M), targets] -= 1
+        d_logits *= weight/M
+        head = self.layers[-1]
+        d_head = Layer(np.dot(hidden.T, d_logits), np.sum(d_logits, axis=0))
+        d_hidden = []
+        d_output = np.dot(d_logits, head.weight.T)
+        for ii in reversed(range(self.num_hidden_layers)):
+            d_output[pre_activation[ii]<0] = 0
+            d_hidden.insert(0, Layer(np.dot(hidden_inputs[ii].T, d_output),
+                                     np.sum(d_output, axis=0)))
+            if ii > 0:
+                d_output = np.dot(d_output, self.layers[ii].weight.T)
+        return cost, d_hidden, d_head
+
     def predict(self, X):
         """
         Predict.
@@ -183,7 +844,7 @@ class BoardgameNeuralNet:
         number of input dimensions.
         """
         # Propagate through network
-        output = X
+        output = self.canonicalise(X)
         for ii in range(self.num_hidden_layers+1):
             output = np.dot(output, self.layers[ii].weight) \
                                                         + self.layers[ii].bias
@@ -192,15 +853,23 @@ class BoardgameNeuralNet:
 
         # Output layer
         output -= np.max(output, axis=1, keepdims=True)    # Prevents overflow
-        log_prob = output - spmisc.logsumexp(output, axis=1, keepdims=True)
+        log_prob = output - logsumexp(output, axis=1, keepdims=True)
 
         return log_prob
 
-    def update(self, X, y):
+    def update(self, X, y, policy_X=None, policy_targets=None,
+               policy_mask=None, policy_weight=1.0):
         """
         Update using back propagation
+        If the net has a policy head, policy_X (MxD inputs), policy_targets
+        (M move indices) and optionally policy_mask (MxP legal moves) add a
+        policy loss, weighted by policy_weight, to the same update.
         """
+        start = time.perf_counter()
         N,D = X.shape
+        if N == 0:
+            raise ValueError("Cannot update on an empty batch.")
+        X = self.canonicalise(X)
 
         # Propagate through network
         layer_output = [X]
@@ -214,12 +883,11 @@ class BoardgameNeuralNet:
 
         # Output layer
         output -= np.max(output, axis=1, keepdims=True)    # Prevents overflow
-        log_prob = output - spmisc.logsumexp(output, axis=1, keepdims=True)
+        log_prob = output - logsumexp(output, axis=1, keepdims=True)
         truth_log_prob = log_prob[range(N), y]
         cost = -np.sum(truth_log_prob)/N
         for layer in self.layers:
             cost += 0.5 * self.regulariser * np.sum(layer.weight**2)
-        self.cost_sequence.append(cost)
 
         # Back propagation
         d_out = np.exp(log_prob)
@@ -237,14 +905,207 @@ class BoardgameNeuralNet:
                                                     self.layers[ii].weight.T)
                 d_layer_output[layer_output[ii]<0] = 0
 
+        # Policy head, sharing the hidden layers
+        policy_cost = None
+        if self.num_policy_outputs:
+            head = self.layers[-1]
+            d_head = Layer(self.regulariser*head.weight,
+                           np.zeros_like(head.bias))
+            if policy_X is not None:
+                policy_cost, d_hidden, d_policy = self._policy_gradients(
+                                        policy_X, policy_targets, policy_mask,
+                                        policy_weight)
+                for ii, dl in enumerate(d_hidden):
+                    d_layer_params[ii].weight[...] += dl.weight
+                    d_layer_params[ii].bias[...] += dl.bias
+                d_head.weight[...] += d_policy.weight
+                d_head.bias[...] += d_policy.bias
+                cost += policy_cost
+            d_layer_params.append(d_head)
+
         # Check for infinities
         for dl in d_layer_params:
             if (np.any(np.isinf(dl.weight)) or np.any(np.isinf(dl.bias))):
                 print(d_layer_params)
                 raise ValueError("Infinities in the parameter derivatives.") 
         
+        grad_norm = np.sqrt(sum(np.sum(dl.weight**2) + np.sum(dl.bias**2)
+                                for dl in d_layer_params))
+
         # Training update
-        for ii in range(self.num_hidden_layers+1):
-            self.layers[ii].weight[:] -= self.step_size*d_layer_params[ii].weight
-            self.layers[ii].bias[:] -= self.step_size*d_layer_params[ii].bias
+        self.optimiser.step(self.layers, d_layer_params)
+        self.version += 1
+
+        self.telemetry.record("cost", cost)
+        if policy_cost is not None:
+            self.telemetry.record("policy_cost", policy_cost)
+        self.telemetry.record("grad_norm", grad_norm)
+        self.telemetry.record("update_time", time.perf_counter() - start)
         
+
+
+class StackedNeuralNet:
+    """
+    K independent nets with the architecture of BoardgameNeuralNet, held as
+    (K, in, out) weight and (K, out) bias tensors so that forward passes and
+    back propagation for all of them are single batched matmuls. Each net
+    has its own step size and regulariser (scalars are shared), so seed
+    sweeps and ensembles cost little more than a single net.
+
+    Net k starts with the same weights as a BoardgameNeuralNet built with
+    the k-th random stream spawned from random_state, and trains the same
+    way; net(k) extracts it as a BoardgameNeuralNet.
+    """
+    def __init__(self,
+                 num_nets,
+                 random_state=None,
+                 num_inputs=10,
+                 num_hidden_layers=1,
+                 num_hidden_units=[100],
+                 step_size=None,
+                 regulariser=1E-4,
+                 optimiser=None,
+                 telemetry=None,
+                 ):
+        """
+        Initialise the nets. step_size and regulariser may be scalars or
+        arrays of num_nets values. The optimiser defaults to SGD with a step
+        size of 1E-1; step_size, if given, replaces the step size of the
+        optimiser, and otherwise a given optimiser keeps its own.
+        """
+        nets = [BoardgameNeuralNet(random_state=rng,
+                                   num_inputs=num_inputs,
+                                   num_hidden_layers=num_hidden_layers,
+                                   num_hidden_units=num_hidden_units)
+                for rng in spawn_rngs(random_state, num_nets)]
+        self.num_nets = num_nets
+        self.num_inputs = num_inputs
+        self.num_hidden_layers = num_hidden_layers
+        self.num_hidden_units = num_hidden_units
+        self.regulariser = regulariser
+        self.layers = [Layer(np.stack([net.layers[ii].weight for net in nets]),
+                             np.stack([net.layers[ii].bias for net in nets]))
+                       for ii in range(num_hidden_layers+1)]
+        if optimiser is None:
+            optimiser = SGDOptimiser(1E-1 if step_size is None else step_size)
+        elif step_size is not None:
+            optimiser.step_size = step_size
+        self.optimiser = optimiser
+        self.optimiser.initialise(self.layers)
+        if telemetry is None:
+            telemetry = Telemetry()
+        self.telemetry = telemetry
+        self.version = 0
+
+    @property
+    def step_size(self):
+        """
+        Step size of the optimiser (a scalar or one per net).
+        """
+        return self.optimiser.step_size
+
+    @step_size.setter
+    def step_size(self, value):
+        self.optimiser.step_size = value
+
+    def net(self, index):
+        """
+        A BoardgameNeuralNet with a copy of the weights of one of the nets.
+        """
+        regulariser = self.regulariser
+        if np.ndim(regulariser) > 0:
+            regulariser = float(regulariser[index])
+        step_size = self.step_size
+        if np.ndim(step_size) > 0:
+            step_size = float(step_size[index])
+        net = BoardgameNeuralNet(num_inputs=self.num_inputs,
+                                 num_hidden_layers=self.num_hidden_layers,
+                                 num_hidden_units=self.num_hidden_units,
+                                 step_size=step_size,
+                                 regulariser=regulariser)
+        net.layers = [Layer(layer.weight[index].copy(),
+                            layer.bias[index].copy()) for layer in self.layers]
+        net.optimiser.initialise(net.layers)
+        return net
+
+    def _forward(self, X):
+        """
+        Propagate inputs through every net, returning the output of each
+        layer before its nonlinearity and the log probabilities. X is NxD
+        (shared by the nets) or KxNxD.
+        """
+        layer_output = []
+        output = X
+        for layer in self.layers:
+            output = np.matmul(output, layer.weight) + layer.bias[:,None,:]
+            layer_output.append(output.copy())
+            # As in BoardgameNeuralNet, the output layer is rectified too
+            output = np.maximum(0, output)
+
+        output -= np.max(output, axis=2, keepdims=True)    # Prevents overflow
+        log_prob = output - logsumexp(output, axis=2, keepdims=True)
+        return layer_output, log_prob
+
+    def predict(self, X):
+        """
+        Predict. X is a NxD array of inputs for every net, or a KxNxD array
+        with different inputs for each. Returns a KxNx3 array of log
+        probabilities.
+        """
+        return self._forward(X)[1]
+
+    def update(self, X, y):
+        """
+        Update every net using back propagation. X is NxD or KxNxD as for
+        predict, and y the corresponding N or KxN outcome indices.
+        """
+        start = time.perf_counter()
+        K = self.num_nets
+        N = X.shape[-2]
+        if N == 0:
+            raise ValueError("Cannot update on an empty batch.")
+        y = np.broadcast_to(y, (K, N))
+        regulariser = Optimiser._broadcast(self.regulariser,
+                                           self.layers[0].weight)
+
+        layer_output, log_prob = self._forward(X)
+        nets = np.arange(K)[:,None]
+        cost = -np.sum(log_prob[nets, np.arange(N), y], axis=1)/N
+        for layer in self.layers:
+            cost += 0.5 * np.ravel(regulariser) \
+                        * np.sum(layer.weight**2, axis=(1,2))
+
+        # Back propagation
+        d_layer_output = np.exp(log_prob)
+        d_layer_output[nets, np.arange(N), y] -= 1
+        # Weight gradients use the hidden outputs before rectification, as
+        # in BoardgameNeuralNet.update
+        inputs = [X] + layer_output[:-1]
+        d_layer_params = deque([])
+        for ii in reversed(range(self.num_hidden_layers+1)):
+            dW = np.matmul(np.swapaxes(inputs[ii], -1, -2), d_layer_output)/N \
+                    + regulariser*self.layers[ii].weight
+            db = np.sum(d_layer_output, axis=1)/N
+            d_layer_params.appendleft(Layer(dW, db))
+
+            if ii > 0:
+                d_layer_output = np.matmul(d_layer_output,
+                                    np.swapaxes(self.layers[ii].weight, 1, 2))
+                d_layer_output[layer_output[ii-1]<0] = 0
+
+        for dl in d_layer_params:
+            if (np.any(np.isinf(dl.weight)) or np.any(np.isinf(dl.bias))):
+                raise ValueError("Infinities in the parameter derivatives.")
+
+        grad_norm = np.sqrt(sum(np.sum(dl.weight**2, axis=(1,2))
+                                + np.sum(dl.bias**2, axis=1)
+                                for dl in d_layer_params))
+
+        # Training update
+        self.optimiser.step(self.layers, d_layer_params)
+        self.version += 1
+
+        self.telemetry.record("cost", np.mean(cost))
+        self.telemetry.record("grad_norm", np.mean(grad_norm))
+        self.telemetry.record("update_time", time.perf_counter() - start)
+        return cost
@@ -0,0 +1,384 @@
+# Command line entry point:
+#     python -m boardgames {play,train,pbt,tournament,bench,perft,retrograde}
+#
+# Only the standard library is imported at the top level. Each subcommand
+# imports what it needs, so that e.g. matplotlib is only loaded for --plot.
+import argparse
+import time
+
+
+# Module and class of each --game choice, and the player kinds which can
+# play it (None for all of them)
+GAME_KINDS = {"classic": ("noughtsandcrosses", "NoughtsAndCrossesGame",
+                          None),
+              "ultimate": ("ultimatenoughtsandcrosses",
+                           "UltimateNoughtsAndCrossesGame",
+                           ("dumb", "naive"))}
+
+def player_spec(spec):
+    """
+    Check a player specification of the form kind[:name], or table:file.npz
+    for a compiled table player.
+    """
+    from noughtsandcrosses import PLAYER_KINDS
+
+    kind, _, arg = spec.partition(":")
+    if kind not in PLAYER_KINDS:
+        raise argparse.ArgumentTypeError("unknown player kind '{}' (choose "
+                        "from {})".format(kind, ", ".join(sorted(PLAYER_KINDS))))
+    if (kind == "table") and not arg:
+        raise argparse.ArgumentTypeError("table players need a file: "
+                                         "table:file.npz")
+    return spec
+
+def game_class(kind):
+    """
+    The game class for a --game choice.
+    """
+    import importlib
+
+    module_name, class_name, _ = GAME_KINDS[kind]
+    return getattr(importlib.import_module(module_name), class_name)
+
+def check_game_players(parser, args):
+    """
+    Reject player kinds which cannot play the --game chosen, before any
+    game starts. train always plays classic games, so is not checked.
+    """
+    supported = GAME_KINDS[args.game][2]
+    if (supported is None) or (args.command == "train"):
+        return
+    for spec in getattr(args, "players", []):
+        kind = spec.partition(":")[0]
+        if kind not in supported:
+            parser.error("{} players cannot play --game {} (choose from "
+                         "{})".format(kind, args.game, ", ".join(supported)))
+
+def play_match(players, num_games, verbosity=0, move_scheduler=None,
+               random_state=None, game_class=None):
+    """
+    Play a number of games (of noughts and crosses unless another game_class
+    is given), each with its own random stream spawned from random_state,
+    and return the list of winners.
+    """
+    from boardgame import spawn_rngs
+    from noughtsandcrosses import NoughtsAndCrossesGame
+
+    if game_class is None:
+        game_class = NoughtsAndCrossesGame
+    results = []
+    for rng in spawn_rngs(random_state, num_games):
+        game = game_class(players, verbosity=verbosity,
+                          move_scheduler=move_scheduler, rng=rng)
+        game.play_game()
+        results.append(game.winner)
+    return results
+
+def seed_sequence(args):
+    """
+    The root of all random streams for a command, from --seed if given.
+    """
+    import numpy as np
+    return np.random.SeedSequence(args.seed)
+
+
+def cmd_play(args):
+    """
+    Play interactive (or watched) games.
+    """
+    from noughtsandcrosses import make_players
+
+    player_seeds, game_seeds = seed_sequence(args).spawn(2)
+    players = make_players(args.players, player_seeds)
+    results = play_match(players, args.games, verbosity=args.verbosity,
+                         random_state=game_seeds,
+                         game_class=game_class(args.game))
+    for name in set(results):
+        print("{}: {}".format(name, results.count(name)))
+
+def cmd_train(args):
+    """
+    Train a learning player until it stops losing to the evaluation opponent.
+    """
+    from noughtsandcrosses import (LearningNoughtsAndCrossesPlayer,
+                                   make_player, make_players)
+    from telemetry import Telemetry
+    from training import OpponentCurriculum, TrainingScheduler
+
+    player_seeds, training_seeds = seed_sequence(args).spawn(2)
+    learner_seed, evaluator_seed, opponent_seeds = player_seeds.spawn(3)
+    player = LearningNoughtsAndCrossesPlayer(args.name, learner_seed,
+                                             invariant=args.invariant,
+                                             policy=args.policy)
+    if args.telemetry is not None:
+        player.neural_net.telemetry = Telemetry(filename=args.telemetry)
+    opponents = make_players(args.opponents, opponent_seeds)
+    if args.curriculum is not None:
+        opponents = OpponentCurriculum(
+                                opponents, strategy=args.curriculum,
+                                snapshot_interval=args.snapshot_interval)
+    evaluator = make_player(args.evaluator, " (evaluator)", evaluator_seed)
+    scheduler = TrainingScheduler(player,
+                                  opponents,
+                                  evaluator,
+                                  eval_interval=args.eval_interval,
+                                  num_eval_games=args.eval_games,
+                                  max_games=args.max_games,
+                                  target_loss_rate=args.target_loss_rate,
+                                  patience=args.patience,
+                                  num_workers=args.workers,
+                                  verbosity=args.verbosity,
+                                  random_state=training_seeds)
+    scheduler.run()
+
+    if args.save is not None:
+        from analysis import compile_policy
+        best = scheduler.best_player or player
+        compile_policy(best, args.name).save(args.save)
+        print("Saved table player to {}.".format(args.save))
+
+    if args.plot:
+        import numpy as np
+        from matplotlib import pyplot as plt
+
+        evaluations = np.array(scheduler.evaluations)
+        fig = plt.figure()
+        ax = fig.add_subplot(2,1,1)
+        ax.plot(*player.neural_net.telemetry.history("cost"))
+        ax.set_ylabel("cost")
+        ax = fig.add_subplot(2,1,2)
+        if len(evaluations):
+            ax.plot(evaluations[:,0], evaluations[:,1:])
+            ax.legend(["won", "drew", "lost"])
+        ax.set_xlabel("training games")
+        plt.show()
+
+def cmd_pbt(args):
+    """
+    Tune a learning player's hyperparameters by population-based training.
+    """
+    from pbt import PopulationTrainer, load_config
+
+    overrides = dict()
+    if args.seed is not None:
+        overrides["seed"] = args.seed
+    if args.workers is not None:
+        overrides["num_workers"] = args.workers
+    trainer = PopulationTrainer(load_config(args.config, **overrides),
+                                verbosity=args.verbosity)
+    trainer.run()
+
+    if args.save is not None:
+        from analysis import compile_policy
+        best = trainer.best_player
+        compile_policy(best).save(args.save)
+        print("Saved table player {} to {}.".format(best.name, args.save))
+
+def cmd_tournament(args):
+    """
+    Play a round-robin tournament.
+    """
+    from matchstats import PairingStats, SPRT, play_sprt_match
+    from noughtsandcrosses import make_players
+
+    player_seeds, match_seeds = seed_sequence(args).spawn(2)
+    players = make_players(args.players, player_seeds, suffixes=True)
+    move_scheduler = None
+    if (args.move_time is not None) or (args.game_time is not None):
+        from timecontrol import MoveScheduler
+        move_scheduler = MoveScheduler(args.move_time, args.game_time)
+    points = dict((plyr.name, 0.0) for plyr in players)
+    for ii in range(len(players)):
+        for jj in range(ii+1, len(players)):
+            pair = [players[ii], players[jj]]
+            pair_seeds, = match_seeds.spawn(1)
+            if args.sprt is None:
+                stats = PairingStats()
+                for winner in play_match(pair, args.games,
+                                         move_scheduler=move_scheduler,
+                                         random_state=pair_seeds,
+                                         game_class=game_class(args.game)):
+                    stats.update((winner == pair[0].name)
+                                 - (winner == pair[1].name))
+                status = ""
+            else:
+                stats, status = play_sprt_match(pair[0], pair[1],
+                                                SPRT(*args.sprt),
+                                                max_games=args.games,
+                                                random_state=pair_seeds,
+                                                game_class=game_class(
+                                                                args.game),
+                                                move_scheduler=move_scheduler)
+                status = " SPRT: {}".format(status or "undecided")
+            print("{} vs. {}: {}{}".format(pair[0].name, pair[1].name,
+                                           stats, status))
+            points[pair[0].name] += stats.wins + 0.5*stats.draws
+            points[pair[1].name] += stats.losses + 0.5*stats.draws
+    print("")
+    for name in sorted(points, key=points.get, reverse=True):
+        print("{:>24} {:8.1f}".format(name, points[name]))
+
+def cmd_bench(args):
+    """
+    Time games between two computer players.
+    """
+    from noughtsandcrosses import make_players
+
+    player_seeds, game_seeds = seed_sequence(args).spawn(2)
+    players = make_players(args.players, player_seeds, suffixes=True)
+    start = time.perf_counter()
+    play_match(players, args.games, random_state=game_seeds,
+               game_class=game_class(args.game))
+    elapsed = time.perf_counter() - start
+    print("Played {} games in {:.3f}s ({:.1f} games/s).".format(
+                                args.games, elapsed, args.games/elapsed))
+
+def cmd_perft(args):
+    """
+    Count and time the game tree from the starting position.
+    """
+    from perft import run_perft
+
+    board_class = game_class(args.game).board_class
+    for depth in range(1, args.depth+1):
+        result = run_perft(board_class, depth, check=False)
+        check = {True: "ok", False: "WRONG", None: ""}[result.correct]
+        print("depth {:2d} {:12d} nodes {:9.3f}s {:12.0f} nodes/s {}".format(
+                    depth, result.nodes, result.seconds,
+                    result.nodes_per_second, check))
+
+def cmd_retrograde(args):
+    """
+    Solve k-in-a-row or Connect Four on a small board by retrograde analysis.
+    """
+    import numpy as np
+    from retrograde import (KInARowPositions, ConnectFourPositions,
+                            retrograde_solve, UNKNOWN)
+
+    if args.kind == "connect4":
+        space = ConnectFourPositions(args.cols, args.rows, args.k)
+    else:
+        space = KInARowPositions(args.rows, args.cols, args.k)
+    start = time.perf_counter()
+    table = retrograde_solve(space, args.table, verbosity=args.verbosity)
+    elapsed = time.perf_counter() - start
+    value = int(table[space.start_code])
+    result = {1: "X wins", 0: "draw", -1: "O wins"}[value]
+    print("Solved {} positions in {:.1f}s: {}.".format(
+                np.count_nonzero(table != UNKNOWN), elapsed, result))
+
+
+def build_parser():
+    """
+    Build the command line argument parser.
+    """
+    parser = argparse.ArgumentParser(prog="python -m boardgames",
+                                     description="Noughts and crosses.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--game", choices=sorted(GAME_KINDS),
+                        default="classic",
+                        help="board to play on (train always uses classic)")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    play = subparsers.add_parser("play", help="play games")
+    play.add_argument("players", nargs=2, metavar="PLAYER", type=player_spec)
+    play.add_argument("--games", type=int, default=1)
+    play.add_argument("--verbosity", type=int, default=3)
+    play.set_defaults(func=cmd_play)
+
+    train = subparsers.add_parser("train", help="train a learning player")
+    train.add_argument("--name", default="Franklin")
+    train.add_argument("--opponents", nargs="+", type=player_spec,
+                       default=["expert", "naive"])
+    train.add_argument("--evaluator", type=player_spec, default="expert")
+    train.add_argument("--curriculum", choices=["loss", "progress"],
+                       default=None,
+                       help="sample opponents by the learner's recent loss "
+                            "rate or learning progress against each, "
+                            "instead of in turn")
+    train.add_argument("--snapshot-interval", type=int, default=None,
+                       help="with --curriculum, add a frozen snapshot of the "
+                            "learner to the opponents this often")
+    train.add_argument("--eval-interval", type=int, default=100)
+    train.add_argument("--eval-games", type=int, default=100)
+    train.add_argument("--max-games", type=int, default=10000)
+    train.add_argument("--target-loss-rate", type=float, default=0.0)
+    train.add_argument("--patience", type=int, default=10)
+    train.add_argument("--workers", type=int, default=2)
+    train.add_argument("--verbosity", type=int, default=1)
+    train.add_argument("--invariant", action="store_true",
+                       help="use a symmetry-invariant net instead of "
+                            "training on symmetric copies of each state")
+    train.add_argument("--policy", action="store_true",
+                       help="give the net a policy head, so that the trained "
+                            "player picks moves with one forward pass")
+    train.add_argument("--save", default=None, metavar="FILE",
+                       help="compile the trained player to a table file")
+    train.add_argument("--telemetry", default=None, metavar="FILE",
+                       help="stream training metrics to a .csv file (or a "
+                            "series of .npz files)")
+    train.add_argument("--plot", action="store_true")
+    train.set_defaults(func=cmd_train)
+
+    pbt = subparsers.add_parser("pbt", help="tune a learning player by "
+                                "population-based training")
+    pbt.add_argument("--config", default=None, metavar="FILE",
+                     help="JSON settings (see pbt.DEFAULT_CONFIG)")
+    pbt.add_argument("--workers", type=int, default=None)
+    pbt.add_argument("--verbosity", type=int, default=1)
+    pbt.add_argument("--save", default=None, metavar="FILE",
+                     help="compile the best player to a table file")
+    pbt.set_defaults(func=cmd_pbt)
+
+    tournament = subparsers.add_parser("tournament",
+                                       help="play a round-robin tournament")
+    tournament.add_argument("players", nargs="+", metavar="PLAYER",
+                            type=player_spec)
+    tournament.add_argument("--games", type=int, default=100)
+    tournament.add_argument("--sprt", type=float, nargs=2, default=None,
+                            metavar=("ELO0", "ELO1"),
+                            help="stop each pairing once an SPRT between "
+                                 "these Elo differences decides (--games is "
+                                 "then the maximum)")
+    tournament.add_argument("--move-time", type=float, default=None,
+                            help="seconds allowed per move")
+    tournament.add_argument("--game-time", type=float, default=None,
+                            help="seconds allowed per player per game")
+    tournament.set_defaults(func=cmd_tournament)
+
+    bench = subparsers.add_parser("bench", help="time games between players")
+    bench.add_argument("players", nargs=2, metavar="PLAYER", type=player_spec)
+    bench.add_argument("--games", type=int, default=1000)
+    bench.set_defaults(func=cmd_bench)
+
+    perft = subparsers.add_parser("perft", help="count and time the game "
+                                  "tree, checking against known totals")
+    perft.add_argument("--depth", type=int, default=9)
+    perft.set_defaults(func=cmd_perft)
+
+    retrograde = subparsers.add_parser("retrograde", help="solve a small "
+                                       "game exactly by retrograde analysis")
+    retrograde.add_argument("kind", choices=["nac", "connect4"])
+    retrograde.add_argument("--rows", type=int, default=4)
+    retrograde.add_argument("--cols", type=int, default=4)
+    retrograde.add_argument("--k", type=int, default=4)
+    retrograde.add_argument("--table", default=None, metavar="FILE",
+                            help="file for the np.memmap table of values")
+    retrograde.add_argument("--verbosity", type=int, default=0)
+    retrograde.set_defaults(func=cmd_retrograde)
+
+    return parser
+
+def main(argv=None):
+    """
+    Run the command line interface.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_game_players(parser, args)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 # Noughts and Crosses demo - Computer players
 import numpy as np
-from matplotlib import pyplot as plt
 
 from boardgame import BoardgameError
 from noughtsandcrosses import (NoughtsAndCrossesGame,
@@ -9,7 +8,7 @@ from noughtsandcrosses import (NoughtsAndCrossesGame,
                                LearningNoughtsAndCrossesPlayer,
                                ExpertNoughtsAndCrossesPlayer)
 
-np.random.seed(seed=0)
+rng = np.random.default_rng(0)
 
 players = []
 players.append(DumbNoughtsAndCrossesPlayer("Colin"))
@@ -24,7 +23,7 @@ for idx in matches:
     results = []
     opponents = [players[idx[0]],players[idx[1]]]
     for gg in range(num_games):
-        game = NoughtsAndCrossesGame(opponents, verbosity=0)
+        game = NoughtsAndCrossesGame(opponents, verbosity=0, rng=rng)
         game.play_game()
         results.append(game.winner)
 
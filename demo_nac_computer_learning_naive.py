@@ -1,16 +1,15 @@
 # Noughts and Crosses demo - Learning to beat a naive computer player
 import numpy as np
-from matplotlib import pyplot as plt
 
 from boardgame import BoardgameError
 from noughtsandcrosses import (NoughtsAndCrossesGame,
                                NaiveNoughtsAndCrossesPlayer,
                                LearningNoughtsAndCrossesPlayer)
 
-np.random.seed(seed=1)
+rng = np.random.default_rng(1)
 
 player1 = NaiveNoughtsAndCrossesPlayer("Hubert")
-player2 = LearningNoughtsAndCrossesPlayer("Franklin")
+player2 = LearningNoughtsAndCrossesPlayer("Franklin", rng)
 
 
 num_training_games = 1000
@@ -21,7 +20,7 @@ testing_results = []
 player2.learning = False    # Turns off stochastic decisions and updating
 test_result = []
 for gg in range(num_testing_games):
-    game = NoughtsAndCrossesGame([player1,player2], verbosity=0)
+    game = NoughtsAndCrossesGame([player1,player2], verbosity=0, rng=rng)
     game.play_game()
     testing_results.append(game.winner)
 print("Played {} games:".format(num_testing_games))
@@ -35,7 +34,7 @@ for gg in range(num_training_games):
     if (((gg+1)%100) == 0):
         print("Played {} of {} games.".format(gg+1, num_training_games))
 
-    game = NoughtsAndCrossesGame([player1, player2], verbosity=0)
+    game = NoughtsAndCrossesGame([player1, player2], verbosity=0, rng=rng)
     game.play_game()
 
 # Testing
@@ -43,7 +42,7 @@ testing_results = []
 player2.learning = False    # Turns off stochastic decisions and updating
 test_result = []
 for gg in range(num_testing_games):
-    game = NoughtsAndCrossesGame([player1,player2], verbosity=0)
+    game = NoughtsAndCrossesGame([player1,player2], verbosity=0, rng=rng)
     game.play_game()
     testing_results.append(game.winner)
 print("Played {} games:".format(num_testing_games))
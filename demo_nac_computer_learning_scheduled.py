@@ -0,0 +1,25 @@
+# Noughts and Crosses demo - Training against the expert until it stops losing
+import numpy as np
+
+from noughtsandcrosses import (ExpertNoughtsAndCrossesPlayer,
+                               NaiveNoughtsAndCrossesPlayer,
+                               LearningNoughtsAndCrossesPlayer)
+from training import TrainingScheduler
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+
+    player = LearningNoughtsAndCrossesPlayer("Franklin", rng)
+    opponents = [ExpertNoughtsAndCrossesPlayer("Horatio"),
+                 NaiveNoughtsAndCrossesPlayer("Hubert")]
+
+    scheduler = TrainingScheduler(player,
+                                  opponents,
+                                  ExpertNoughtsAndCrossesPlayer("Persephone"),
+                                  eval_interval=100,
+                                  num_eval_games=100,
+                                  max_games=10000,
+                                  target_loss_rate=0.0,
+                                  patience=10,
+                                  random_state=0)
+    scheduler.run()
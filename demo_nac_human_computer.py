@@ -1,7 +1,6 @@
 # Noughts and Crosses demo - Human players
 
 import numpy as np
-from matplotlib import pyplot as plt
 
 from boardgame import BoardgameError
 from noughtsandcrosses import (NoughtsAndCrossesGame,
@@ -11,7 +10,7 @@ from noughtsandcrosses import (NoughtsAndCrossesGame,
                                LearningNoughtsAndCrossesPlayer,
                                ExpertNoughtsAndCrossesPlayer)
 
-np.random.seed(seed=0)
+rng = np.random.default_rng(0)
 
 name = input("Enter name of human player: ")
 
@@ -20,12 +19,12 @@ player2 = DumbNoughtsAndCrossesPlayer("Colin")
 player3 = NaiveNoughtsAndCrossesPlayer("Hubert")
 player4 = ExpertNoughtsAndCrossesPlayer("Horatio")
 
-game = NoughtsAndCrossesGame([player1,player2], verbosity=3)
+game = NoughtsAndCrossesGame([player1,player2], verbosity=3, rng=rng)
 game.play_game()
 
-game = NoughtsAndCrossesGame([player1,player3], verbosity=3)
+game = NoughtsAndCrossesGame([player1,player3], verbosity=3, rng=rng)
 game.play_game()
 
-game = NoughtsAndCrossesGame([player1,player4], verbosity=3)
+game = NoughtsAndCrossesGame([player1,player4], verbosity=3, rng=rng)
 game.play_game()
 
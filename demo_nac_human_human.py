@@ -1,7 +1,6 @@
 # Noughts and Crosses demo - Human players
 
 import numpy as np
-from matplotlib import pyplot as plt
 
 from boardgame import BoardgameError
 from noughtsandcrosses import (NoughtsAndCrossesGame,
@@ -11,12 +10,12 @@ from noughtsandcrosses import (NoughtsAndCrossesGame,
                                LearningNoughtsAndCrossesPlayer,
                                ExpertNoughtsAndCrossesPlayer)
 
-np.random.seed(seed=0)
+rng = np.random.default_rng(0)
 
 name1 = input("Enter name of one player: ")
 name2 = input("Enter name of the other player: ")
 
 player1 = HumanNoughtsAndCrossesPlayer(name1)
 player2 = HumanNoughtsAndCrossesPlayer(name2)
-game = NoughtsAndCrossesGame([player1,player2], verbosity=3)
+game = NoughtsAndCrossesGame([player1,player2], verbosity=3, rng=rng)
 game.play_game()
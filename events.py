@@ -0,0 +1,134 @@
+from collections import namedtuple
+import queue
+import threading
+
+
+GameBegun = namedtuple('GameBegun', ['game_id'])
+MoveMade = namedtuple('MoveMade', ['game_id', 'player', 'turn', 'move'])
+GameFinished = namedtuple('GameFinished', ['game_id', 'result', 'winner'])
+
+
+class EventBus:
+    """
+    Dispatches game events to subscribers registered per event type (one of
+    the event namedtuples above), optionally only for a single game. Games
+    check has_subscribers before building an event, so event types nobody
+    listens to cost nothing.
+    """
+    def __init__(self):
+        """
+        Create the bus.
+        """
+        self._subscribers = dict()
+
+    def subscribe(self, event_type, callback, game_id=None):
+        """
+        Call callback(event) for every event of event_type, or only for those
+        from game game_id if it is given.
+        """
+        by_game = self._subscribers.setdefault(event_type, dict())
+        by_game.setdefault(game_id, []).append(callback)
+
+    def unsubscribe(self, event_type, callback, game_id=None):
+        """
+        Remove a subscription.
+        """
+        by_game = self._subscribers.get(event_type, dict())
+        callbacks = by_game.get(game_id, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            by_game.pop(game_id, None)
+        if not by_game:
+            self._subscribers.pop(event_type, None)
+
+    def unsubscribe_game(self, game_id):
+        """
+        Remove every subscription for a single game.
+        """
+        for event_type in list(self._subscribers):
+            by_game = self._subscribers[event_type]
+            by_game.pop(game_id, None)
+            if not by_game:
+                del self._subscribers[event_type]
+
+    def has_subscribers(self, event_type):
+        """
+        Whether anyone is listening for an event type.
+        """
+        return event_type in self._subscribers
+
+    def publish(self, event):
+        """
+        Deliver an event to its subscribers.
+        """
+        by_game = self._subscribers.get(type(event))
+        if by_game is None:
+            return
+        for callback in by_game.get(None, ()):
+            callback(event)
+        for callback in by_game.get(event.game_id, ()):
+            callback(event)
+
+
+class BatchedSubscriber:
+    """
+    Collects events and passes them to callback(events) in lists of
+    batch_size. Call flush to deliver a final partial batch.
+    """
+    def __init__(self, callback, batch_size=100):
+        """
+        Create the subscriber.
+        """
+        self.callback = callback
+        self.batch_size = batch_size
+        self._events = []
+
+    def __call__(self, event):
+        self._events.append(event)
+        if len(self._events) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Deliver any events collected so far.
+        """
+        if self._events:
+            events, self._events = self._events, []
+            self.callback(events)
+
+
+class AsyncSubscriber:
+    """
+    Delivers events to callback(event) from a background thread, so that
+    slow observers do not hold up the game loop. Call close to deliver the
+    remaining events and stop the thread.
+    """
+    def __init__(self, callback):
+        """
+        Create the subscriber and start its thread.
+        """
+        self.callback = callback
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._deliver, daemon=True)
+        self._thread.start()
+
+    def __call__(self, event):
+        self._events.put(event)
+
+    def _deliver(self):
+        """
+        Background loop: pass queued events to the callback.
+        """
+        while True:
+            event = self._events.get()
+            if event is None:
+                break
+            self.callback(event)
+
+    def close(self):
+        """
+        Deliver the remaining events and stop the thread.
+        """
+        self._events.put(None)
+        self._thread.join()
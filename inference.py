@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class _Request:
+    """
+    A pending prediction.
+    """
+    def __init__(self, X):
+        self.X = X
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class InferenceService:
+    """
+    Micro-batching front end for a BoardgameNeuralNet. Many threads (e.g. one
+    per concurrent game) call predict with a few rows each. A background
+    thread gathers their requests from a queue and runs them through the net
+    as one batch, once max_batch_size rows have arrived or max_latency
+    seconds have passed since the first request in the batch.
+
+    Attach it to learning players by setting their inference_service
+    attribute. The net is only read, so it should not be updated while the
+    service is running. A predict which gets no answer within timeout
+    seconds raises a TimeoutError.
+    """
+    def __init__(self, neural_net, max_batch_size=256, max_latency=1E-3,
+                 timeout=60.0):
+        """
+        Create the service.
+        """
+        self.neural_net = neural_net
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.timeout = timeout
+        self.num_batches = 0
+        self.num_requests = 0
+        self._requests = queue.Queue()
+        self._thread = None
+        # Guards _thread, so that no request is queued behind the stop
+        # sentinel
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the background thread.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._serve,
+                                                daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """
+        Finish outstanding requests and stop the background thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._requests.put(None)
+        if thread is not None:
+            thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def predict(self, X):
+        """
+        Predict, as BoardgameNeuralNet.predict. Blocks until the batch
+        containing this request has been evaluated.
+        """
+        request = _Request(np.atleast_2d(X))
+        with self._lock:
+            if self._thread is None:
+                raise RuntimeError("The inference service is not running.")
+            self._requests.put(request)
+        if not request.done.wait(self.timeout):
+            raise TimeoutError("No prediction from the inference service "
+                               "within {} seconds.".format(self.timeout))
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _serve(self):
+        """
+        Background loop: gather a batch of requests and evaluate it.
+        """
+        stopping = False
+        while not stopping:
+            request = self._requests.get()
+            if request is None:
+                break
+            batch = [request]
+            num_rows = request.X.shape[0]
+            deadline = time.perf_counter() + self.max_latency
+            while num_rows < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                num_rows += request.X.shape[0]
+            self._evaluate(batch)
+
+        # Nothing should be queued after the sentinel, but fail anything
+        # that is rather than leave its caller waiting
+        while True:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.error = RuntimeError("The inference service was "
+                                             "stopped.")
+                request.done.set()
+
+    def _evaluate(self, batch):
+        """
+        Run a batch of requests through the net and hand back the results.
+        """
+        self.num_batches += 1
+        self.num_requests += len(batch)
+        try:
+            log_prob = self.neural_net.predict(
+                                    np.vstack([req.X for req in batch]))
+        except Exception as err:
+            for req in batch:
+                req.error = err
+                req.done.set()
+            return
+
+        offset = 0
+        for req in batch:
+            num = req.X.shape[0]
+            req.result = log_prob[offset:offset+num]
+            offset += num
+            req.done.set()
@@ -0,0 +1,210 @@
+import math
+
+from boardgame import spawn_rngs
+from noughtsandcrosses import NoughtsAndCrossesGame
+
+
+def elo_to_score(elo):
+    """
+    Expected score (win=1, draw=1/2, loss=0) for an Elo difference.
+    """
+    return 1/(1 + 10**(-elo/400))
+
+def score_to_elo(score):
+    """
+    Elo difference for an expected score.
+    """
+    score = min(max(score, 1E-6), 1-1E-6)
+    return -400*math.log10(1/score - 1)
+
+
+class PairingStats:
+    """
+    Running win/draw/loss counts for one pairing of players, from the point
+    of view of the first, with an Elo estimate for the difference between
+    them.
+    """
+    def __init__(self):
+        """
+        Start with no games.
+        """
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    @property
+    def num_games(self):
+        """
+        Number of games recorded.
+        """
+        return self.wins + self.draws + self.losses
+
+    def update(self, result):
+        """
+        Add the result of a game: +1 win, 0 draw, -1 loss.
+        """
+        if result > 0:
+            self.wins += 1
+        elif result < 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    @property
+    def score(self):
+        """
+        Mean score per game.
+        """
+        if self.num_games == 0:
+            return 0.5
+        return (self.wins + 0.5*self.draws)/self.num_games
+
+    @property
+    def score_variance(self):
+        """
+        Variance of the score of a single game.
+        """
+        if self.num_games == 0:
+            return 0.0
+        score = self.score
+        return (self.wins*(1-score)**2 + self.draws*(0.5-score)**2
+                            + self.losses*score**2)/self.num_games
+
+    @property
+    def elo(self):
+        """
+        Estimated Elo difference.
+        """
+        return score_to_elo(self.score)
+
+    def elo_interval(self, z=1.96):
+        """
+        Confidence interval on the Elo difference (95% by default), from a
+        normal approximation to the mean score.
+        """
+        if self.num_games == 0:
+            return (-math.inf, math.inf)
+        half_width = z*math.sqrt(self.score_variance/self.num_games)
+        return (score_to_elo(self.score - half_width),
+                score_to_elo(self.score + half_width))
+
+    def __repr__(self):
+        low, high = self.elo_interval()
+        return "+{} ={} -{} (Elo {:.0f}, 95% CI {:.0f} to {:.0f})".format(
+                    self.wins, self.draws, self.losses, self.elo, low, high)
+
+
+class SPRT:
+    """
+    Sequential probability ratio test between the hypotheses that the Elo
+    difference is elo0 (H0) or elo1 (H1), with error rates alpha and beta.
+    Uses the normal approximation to the log-likelihood ratio of the
+    trinomial (win/draw/loss) model, so no decision is made before min_games
+    games have been played. The score and its variance are estimated with
+    pseudo_count games of each result added, so that one-sided results
+    (all wins or all draws, common in noughts and crosses) have a non-zero
+    variance and still lead to a decision.
+    """
+    def __init__(self, elo0=0.0, elo1=50.0, alpha=0.05, beta=0.05,
+                 min_games=20, pseudo_count=0.5):
+        """
+        Set up the test.
+        """
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.min_games = min_games
+        self.pseudo_count = pseudo_count
+        self.lower_bound = math.log(beta/(1-alpha))
+        self.upper_bound = math.log((1-beta)/alpha)
+
+    def llr(self, stats):
+        """
+        Log-likelihood ratio of H1 to H0 given the results so far.
+        """
+        if stats.num_games == 0:
+            return 0.0
+        wins = stats.wins + self.pseudo_count
+        draws = stats.draws + self.pseudo_count
+        losses = stats.losses + self.pseudo_count
+        total = wins + draws + losses
+        score = (wins + 0.5*draws)/total
+        variance = (wins*(1-score)**2 + draws*(0.5-score)**2
+                    + losses*score**2)/total
+        if variance == 0:
+            return 0.0
+        score0 = elo_to_score(self.elo0)
+        score1 = elo_to_score(self.elo1)
+        return stats.num_games * (score1 - score0) \
+                    * (2*score - score0 - score1) / (2*variance)
+
+    def status(self, stats):
+        """
+        "H0" or "H1" once the test has decided, otherwise None.
+        """
+        if stats.num_games < self.min_games:
+            return None
+        llr = self.llr(stats)
+        if llr <= self.lower_bound:
+            return "H0"
+        elif llr >= self.upper_bound:
+            return "H1"
+        return None
+
+
+class MatchStatistics:
+    """
+    Running statistics for every pairing of players seen, keyed on the pair
+    of player names.
+    """
+    def __init__(self):
+        """
+        Start with no games.
+        """
+        self.pairings = dict()
+
+    def record(self, name_a, name_b, winner):
+        """
+        Record a game between two players, given the winner's name (or
+        "Draw").
+        """
+        if (name_b, name_a) in self.pairings:
+            name_a, name_b = name_b, name_a
+        stats = self.pairings.setdefault((name_a, name_b), PairingStats())
+        if winner == name_a:
+            stats.update(1)
+        elif winner == name_b:
+            stats.update(-1)
+        else:
+            stats.update(0)
+        return stats
+
+    def __getitem__(self, names):
+        return self.pairings[names]
+
+
+def play_sprt_match(player_a, player_b, sprt, max_games=1000, stats=None,
+                    random_state=None, game_class=NoughtsAndCrossesGame,
+                    **game_options):
+    """
+    Play games (of noughts and crosses unless another game_class is given)
+    between two players until the SPRT decides or max_games have been
+    played. Each game has its own random
+    stream spawned from random_state. Returns the pairing statistics (from
+    player_a's point of view) and the SPRT status.
+    """
+    if stats is None:
+        stats = PairingStats()
+    rngs = iter(spawn_rngs(random_state, max_games))
+    status = None
+    while (status is None) and (stats.num_games < max_games):
+        game = game_class([player_a, player_b], verbosity=0, rng=next(rngs),
+                          **game_options)
+        game.play_game()
+        if game.winner == player_a.name:
+            stats.update(1)
+        elif game.winner == player_b.name:
+            stats.update(-1)
+        else:
+            stats.update(0)
+        status = sprt.status(stats)
+    return stats, status
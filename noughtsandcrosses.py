@@ -1,16 +1,42 @@
 from copy import deepcopy
 import numpy as np
-from boardgame import Boardgame, Player, BoardgameError, BoardgameNeuralNet
+from boardgame import (Boardgame, Player, BoardgameError, BoardgameNeuralNet,
+                       BoardSnapshot, ValueCache, ZobristHashing, make_rng,
+                       spawn_rngs)
+from events import GameBegun, MoveMade, GameFinished
+from timecontrol import MoveTimeout
 
-class NoughtsAndCrossesBoard:
+class NoughtsAndCrossesBoard(ZobristHashing):
     """
     A Noughts and Crosses Board.
-    Players moves are indicated in state using +1/-1.
+    Players moves are indicated in state using +1/-1, stored as int8.
     """
     index = np.array([[0,1,2],
                       [3,4,5],
                       [6,7,8]])
     marks = np.array(['.','X','O'])
+    code_weights = 3**index
+    num_codes = 3**9
+    symmetry_maps = np.array([[0,1,2,3,4,5,6,7,8],
+                              [2,5,8,1,4,7,0,3,6],
+                              [8,7,6,5,4,3,2,1,0],
+                              [6,3,0,7,4,1,8,5,2],
+                              [6,7,8,3,4,5,0,1,2],
+                              [2,1,0,5,4,3,8,7,6],
+                              [0,3,6,1,4,7,2,5,8],
+                              [8,5,2,7,4,1,6,3,0]])
+    zobrist_shape = (9, 2)
+    max_moves = 9
+    lines = np.array([[0,1,2],
+                      [3,4,5],
+                      [6,7,8],
+                      [0,3,6],
+                      [1,4,7],
+                      [2,5,8],
+                      [0,4,8],
+                      [2,4,6]])
+    line_incidence = np.zeros((9,8), dtype=int)
+    line_incidence[lines, np.arange(8)[:,np.newaxis]] = 1
     board_string = """
         -------
         |{}|{}|{}|
@@ -25,9 +51,11 @@ class NoughtsAndCrossesBoard:
         """
         Create the board
         """
-        self.state = np.zeros((3,3),dtype=int)
+        self.state = np.zeros((3,3),dtype=np.int8)
         self.turn = 1
         self.over = False
+        self.winner = None
+        self._zobrist_reset()
 
     def copy(self):
         """
@@ -58,6 +86,14 @@ class NoughtsAndCrossesBoard:
         else:
             return []
 
+    @property
+    def code(self):
+        """
+        Encodes the state as a base-3 integer, with each cell contributing
+        0 (empty), 1 (X) or 2 (O).
+        """
+        return int(np.sum(np.mod(self.state, 3)*self.code_weights))
+
     @property
     def sums(self):
         """
@@ -71,6 +107,60 @@ class NoughtsAndCrossesBoard:
         sums = np.concatenate((row_sums, col_sums, diag_sum1, diag_sum2))
         return sums
 
+    def _line_counts(self, side):
+        """
+        Count the marks belonging to side, and the empty cells, along all the
+        rows, columns, and diagonals.
+        """
+        cells = self.state.flatten()[self.lines]
+        own = np.count_nonzero(cells == side, axis=1)
+        empty = np.count_nonzero(cells == 0, axis=1)
+        return own, empty
+
+    def threat_lines(self, side):
+        """
+        Returns the indices (into lines) of the lines on which side has two
+        marks and the third cell is empty.
+        """
+        if self.over:
+            return np.array([], dtype=int)
+        own, empty = self._line_counts(side)
+        return np.flatnonzero((own == 2) & (empty == 1))
+
+    def winning_moves(self, side):
+        """
+        Returns the empty cells in which side would complete a line.
+        """
+        if self.over:
+            return np.array([], dtype=int)
+        own, empty = self._line_counts(side)
+        threats = (own == 2) & (empty == 1)
+        return np.flatnonzero((np.dot(self.line_incidence, threats) > 0)
+                              & (self.state.flatten() == 0))
+
+    def threat_counts(self, side):
+        """
+        Returns, for each cell, the number of lines which side could complete
+        on its next turn after playing there. Cells which are occupied, or in
+        which side would win straight away, count zero.
+        """
+        if self.over:
+            return np.zeros(9, dtype=int)
+        own, empty = self._line_counts(side)
+        threats = (own == 2) & (empty == 1)
+        potential = (own == 1) & (empty == 2)
+        free = self.state.flatten() == 0
+        winning = np.dot(self.line_incidence, threats) > 0
+        num_threats = np.dot(self.line_incidence, potential) + np.sum(threats)
+        return num_threats * (free & ~winning)
+
+    def forking_moves(self, side):
+        """
+        Returns the empty cells in which side would make (without winning)
+        two or more lines which it could complete on its next turn.
+        """
+        return np.flatnonzero(self.threat_counts(side) >= 2)
+
     def verify(self, move):
         """
         Verify that a move is valid
@@ -98,6 +188,10 @@ class NoughtsAndCrossesBoard:
             raise BoardgameError("That move is not valid")
         else:
             self.state[move == self.index] = self.turn
+            # Players may hand back a numpy scalar or a one-element array
+            cell = int(np.ravel(move)[0])
+            self._zobrist_toggle(cell, (1-self.turn)//2)
+            self._zobrist_toggle_turn()
             status = self._check_result()
             if status is not None:
                 self.over = True
@@ -106,6 +200,21 @@ class NoughtsAndCrossesBoard:
             else:
                 self.turn = -self.turn
 
+    def unmove(self, move):
+        """
+        Take back a move, removing the mark in that cell and giving the turn
+        back to whoever made it.
+        """
+        mark = self.state[move == self.index]
+        if not np.any(mark):
+            raise BoardgameError("There is no move to take back there")
+        side = int(mark[0])
+        self.state[move == self.index] = 0
+        self._zobrist_toggle(int(np.ravel(move)[0]), (1-side)//2)
+        self._zobrist_toggle_turn()
+        self.over = False
+        self.winner = None
+        self.turn = side
 
     def _check_result(self):
         """
@@ -145,47 +254,81 @@ class NoughtsAndCrossesBoard:
 class NoughtsAndCrossesGame(Boardgame):
     """
     Noughts and crosses game.
-    Each move, the game passes a board object to the current player, who
-    should return it with an appropriate change.
+    Each move, the game passes a read-only snapshot of the board (see
+    boardgame.BoardSnapshot) to the current player, who should return a
+    move. Variants played on other boards with the same interface can
+    subclass this and set board_class.
     """
     game_name = "Noughts & Crosses"
+    board_class = NoughtsAndCrossesBoard
     _player_limit = 2
 
-    def __init__(self, players, verbosity=1):
+    def __init__(self, players, verbosity=1, move_scheduler=None,
+                 max_invalid_moves=10, event_bus=None, rng=None):
         """
-        Add players. Create the board. Decide who starts.
+        Add players. Create the board. Decide who starts. If a move_scheduler
+        (see timecontrol.MoveScheduler) is given, moves are made under its
+        time controls. A player who runs out of time, or who makes
+        max_invalid_moves invalid moves in a row, forfeits the game. Events
+        are published on event_bus, if given, so that observers can follow
+        the game. All random decisions in the game, including the players',
+        are drawn from rng (a seed or numpy Generator).
         """
         self.verbosity = verbosity
+        self.rng = make_rng(rng)
+        self._setup_events(event_bus)
+        self.move_scheduler = move_scheduler
+        self.max_invalid_moves = max_invalid_moves
         self._generate_id()
         self.players = []
         self.add_players(players)
         if (len(self.players) != 2):
-            raise BoardgameError("Must have 2 players for Noughts and Crosses")
-        self.board = NoughtsAndCrossesBoard()
-        shuffle = np.random.random_integers(0,1)
+            raise BoardgameError("Must have 2 players for {}".format(
+                                                            self.game_name))
+        self.board = self.board_class()
+        shuffle = self.rng.integers(0, 2)
         self._order = [None, self.players[shuffle], self.players[1-shuffle]]
-        self._announce("Beginning Noughts and Crosses game: {}. "
+        self._announce("Beginning {} game: {}. "
                        "{} vs. {}. "
                        "{} will go first and be X.".format(
-                        self.game_id, self.players[0].name,
+                        self.game_name, self.game_id, self.players[0].name,
                         self.players[1].name, self._order[1].name), v=1)
 
     def play_game(self):
         """
         Iterate fetching moves from each player.
         """
-        self._notify("begin")
+        self._publish(GameBegun)
+        if self.move_scheduler is not None:
+            self.move_scheduler.new_game()
+        num_invalid = 0
         while True:
             plyr = self._order[self.board.turn]
+            session = plyr.session(self.game_id)
             self._announce("Player {}, please make a move.".format(
                                                             plyr.name), v=3)
-            move = plyr.move(self.board.copy())
+            if self.move_scheduler is None:
+                move = plyr.move(BoardSnapshot(self.board), session)
+            else:
+                try:
+                    move = self.move_scheduler.request_move(plyr, self.board,
+                                                            session)
+                except MoveTimeout:
+                    self._forfeit(plyr, "ran out of time")
+                    break
             valid = self.board.verify(move)
             if not valid:
                 self._announce("Invalid move from player {}.".format(
                                                             plyr.name), v=3)
+                num_invalid += 1
+                if num_invalid >= self.max_invalid_moves:
+                    self._forfeit(plyr, "made too many invalid moves")
+                    break
             else:
+                num_invalid = 0
+                turn = self.board.turn
                 self.board.move(move)
+                self._publish(MoveMade, plyr.name, turn, move)
                 self._announce("Player {} made a move.".format(
                                                             plyr.name), v=3)
                 if (self.verbosity >= 3):
@@ -200,10 +343,26 @@ class NoughtsAndCrossesGame(Boardgame):
                                                             plyr.name), v=2)
                     if (self.verbosity >= 2):
                         self.board.display_board()
-                    self._notify("finish", self.board.winner)
+                    self._publish(GameFinished, self.board.winner,
+                                  self.winner)
                     self.remove_players()
                     break
 
+    def _forfeit(self, plyr, reason):
+        """
+        End the game with a loss for the player whose turn it is. The
+        result is set on the board too, as if the game had been played out.
+        """
+        winner = -self.board.turn
+        self.board.over = True
+        self.board.winner = winner
+        self.board.turn = 0
+        self.winner = self._order[winner].name
+        self._announce("Player {} {} and forfeits. Player {} wins!".format(
+                                    plyr.name, reason, self.winner), v=2)
+        self._publish(GameFinished, winner, self.winner)
+        self.remove_players()
+
 
 class HumanNoughtsAndCrossesPlayer(Player):
     """
@@ -213,7 +372,7 @@ class HumanNoughtsAndCrossesPlayer(Player):
                       ['d','e','f'],
                       ['g','h','i']])
 
-    def move(self, board):
+    def move(self, board, session=None):
         """
         Obtain a move from a human player.
         """
@@ -235,12 +394,12 @@ class DumbNoughtsAndCrossesPlayer(Player):
     A really dumb computer player for noughts and crosses. Plays randomly.
     """
    
-    def move(self, board):
+    def move(self, board, session=None):
         """
         Obtain a move.
         """ 
         legal_moves = board.permitted_moves
-        move = np.random.choice(legal_moves)
+        move = self._rng(session).choice(legal_moves)
         return move
 
 
@@ -251,44 +410,25 @@ class NaiveNoughtsAndCrossesPlayer(Player):
     """
     strategies = ['win', 'block']
    
-    def move(self, board):
+    def move(self, board, session=None):
         """
         Obtain a move.
         """ 
         options = dict()
-        for st in self.strategies:
-            options[st] = []
-
         legal_moves = board.permitted_moves
-        
-        # Loop through the opponents possible moves
-        for mv in legal_moves:
-            bd = board.copy()
-            bd.turn = -bd.turn
-            bd.move(mv)
-
-            # See if they won (or if it was a draw)
-            if bd.over:
-                options['block'].append(mv)
-
-        # Loop through possible moves to check strategies
-        for mv in legal_moves:
-            bd = board.copy()
-            bd.move(mv)
-
-            # See if we won (or it was a draw)
-            if bd.over:
-                options['win'].append(mv)
+        options['win'] = board.winning_moves(board.turn).tolist()
+        options['block'] = board.winning_moves(-board.turn).tolist()
 
         # Decide which option to take
+        rng = self._rng(session)
         move = None
         for st in self.strategies:
             if options[st]:
-                move = np.random.choice(options[st])
+                move = rng.choice(options[st])
                 break
 
         if move is None:
-            move = np.random.choice(legal_moves)
+            move = rng.choice(legal_moves)
 
         return move
 
@@ -308,16 +448,7 @@ class ExpertNoughtsAndCrossesPlayer(Player):
                   'corner',
                   'edge']
 
-    sum_elements = np.array([[0,1,2],
-                             [3,4,5],
-                             [6,7,8],
-                             [0,3,6],
-                             [1,4,7],
-                             [2,5,8],
-                             [0,4,8],
-                             [2,4,6]])
-
-    def move(self, board):
+    def move(self, board, session=None):
         """
         Obtain a move
         """
@@ -328,66 +459,50 @@ class ExpertNoughtsAndCrossesPlayer(Player):
             options[st] = []
 
         legal_moves = board.permitted_moves
-        fork_danger = False
-        
-        # Loop through the opponents possible moves
-        for mv in legal_moves:
-            bd = board.copy()
-            bd.turn = -bd.turn
-            bd.move(mv)
-
-            # See if they won (or if it was a draw)
-            if bd.over:
-                options['block'].append(mv)
+        side = board.turn
 
-            # See if they made a fork
-            sums = -bd.turn*bd.sums
-            if np.sum(sums == 2) == 2:
-                fork_danger = True
-                options['spoon'].append(mv)
+        # Opponent's winning and forking moves
+        options['block'] = board.winning_moves(-side).tolist()
+        options['spoon'] = board.forking_moves(-side).tolist()
+        fork_danger = len(options['spoon']) > 0
 
-        # Loop through possible moves to check strategies
-        for mv in legal_moves:
-            bd = board.copy()
-            bd.move(mv)
+        # Our winning and forking moves
+        options['win'] = board.winning_moves(side).tolist()
+        threat_counts = board.threat_counts(side)
+        options['fork'] = np.flatnonzero(threat_counts >= 2).tolist()
 
-            # See if we won (or it was a draw)
-            if bd.over:
-                options['win'].append(mv)
+        first_play = not np.any(board.state)
 
-            # See if we made a fork
-            sums = -bd.turn*bd.sums
-            if np.sum(sums == 2) == 2:
-                options['fork'].append(mv)
+        # Loop through possible moves to check remaining strategies
+        for mv in legal_moves:
 
             # See if we made a threat
-            if fork_danger:
-                if np.sum(sums == 2) == 1:
+            if fork_danger and (threat_counts[mv] == 1):
+                board.move(mv)
+                if not board.over:
                     # Ensure that blocking the threat doesn't give away a fork
-                    threat_group = self.sum_elements[sums == 2]
-                    possible_fork = np.intersect1d(bd.permitted_moves,
-                                                   threat_group)
-                    obd = bd.copy()
-                    obd.move(possible_fork)
-                    osums = -obd.turn*obd.sums
-                    if not ((np.sum(osums == 2) == 2) and
-                            (np.sum(osums == -2) == 0)):
+                    possible_fork = board.winning_moves(side)[0]
+                    board.move(possible_fork)
+                    if not ((len(board.threat_lines(-side)) == 2) and
+                            (len(board.threat_lines(side)) == 0)):
                         options['threat'].append(mv)
+                    board.unmove(possible_fork)
+                board.unmove(mv)
 
             # Is it the centre? (and not the first play)
-            if ((mv == 4) and (np.sum(np.abs(board.state)) > 0)):
+            if ((mv == 4) and not first_play):
                 options['centre'].append(mv)
 
             # Is it an opposite corner?
             if ((mv in [0,2,6,8]) and 
-                (np.sum(bd.state.flatten()[[mv,8-mv]]) == 0)):
+                (board.state.flatten()[8-mv] == -side)):
                     options['opposite'].append(mv)
 
             # Is it a corner?
             if (mv in [0,2,6,8]):
                 options['corner'].append(mv)
 
-        # Is it an edge?
+            # Is it an edge?
             if (mv in [1,3,5,7,]):
                 options['edge'].append(mv)
 
@@ -397,7 +512,7 @@ class ExpertNoughtsAndCrossesPlayer(Player):
         move = None
         for st in self.strategies:
             if options[st]:
-                move = np.random.choice(options[st])
+                move = self._rng(session).choice(options[st])
                 break
 
         if move is None:
@@ -414,117 +529,315 @@ class LearningNoughtsAndCrossesPlayer(Player):
     about to play).
     """
     strategies = ["win", "block"]
-    symmetry_maps = np.array([[2,5,8,1,4,7,0,3,6],
-                              [8,7,6,5,4,3,2,1,0],
-                              [6,3,0,7,4,1,8,5,2],
-                              [6,7,8,3,4,5,0,1,2],
-                              [2,1,0,5,4,3,8,7,6],
-                              [0,3,6,1,4,7,2,5,8],
-                              [8,5,2,7,4,1,6,3,0]])
-
-    def __init__(self, name):
-        """
-        Create the player.
-        """
-        self.name = name
+    symmetry_maps = NoughtsAndCrossesBoard.symmetry_maps[1:]
+    event_handlers = {GameBegun: 'begin_game',
+                      GameFinished: 'finish_game'}
+
+    def __init__(self, name, rng=None, invariant=False, step_size=3E-1,
+                 regulariser=3E-2, num_hidden_units=250, input_scale=16.0,
+                 selectivity=0.0, value_cache_size=10000, policy=False):
+        """
+        Create the player. rng (a seed or numpy Generator) initialises the
+        net and is used for random decisions made outside of a game. If
+        invariant is set the net is built invariant under the board
+        symmetries, and learns from each game's states alone rather than
+        from all their symmetric equivalents. The remaining arguments are
+        the training hyperparameters; selectivity is the probability of an
+        exploratory random move while learning.
+
+        Net outputs for afterstates are kept in an LRU cache of
+        value_cache_size entries (0 to disable), which is emptied whenever
+        the net's weights change.
+
+        If policy is set the net also has a policy head, trained to predict
+        the move the player's value search picks in each position (seen from
+        the side to move). Once the player stops learning it moves from the
+        policy head alone, with a single forward pass on the current
+        position instead of one per afterstate; the value head is still
+        used for afterstate_values.
+        """
+        Player.__init__(self, name, rng)
         self.learning = True
-        self.input_scale = 16.0
-        self.selectivity = 0.0
-        self.neural_net = BoardgameNeuralNet(num_inputs=9,
+        self.input_scale = input_scale
+        self.selectivity = selectivity
+        self.inference_service = None
+        self.value_cache = ValueCache(value_cache_size) \
+                                            if value_cache_size else None
+        symmetry_maps = NoughtsAndCrossesBoard.symmetry_maps \
+                                                        if invariant else None
+        hidden_units = [num_hidden_units]
+        self.neural_net = BoardgameNeuralNet(random_state=self.rng,
+                                             num_inputs=9,
                                              num_hidden_layers=1,
-                                             num_hidden_units=[250],
-                                             step_size=3E-1,
-                                             regulariser=3E-2)
+                                             num_hidden_units=hidden_units,
+                                             step_size=step_size,
+                                             regulariser=regulariser,
+                                             symmetry_maps=symmetry_maps,
+                                             num_policy_outputs=9 if policy
+                                                                    else 0)
                                              #momentum=0.0,
                                              #dropout_rate=0)
 
-    def move(self, board):
+    @property
+    def hyperparameters(self):
+        """
+        The hyperparameters which can be changed during training.
+        """
+        return {"step_size": self.neural_net.step_size,
+                "regulariser": self.neural_net.regulariser,
+                "input_scale": self.input_scale,
+                "selectivity": self.selectivity}
+
+    @hyperparameters.setter
+    def hyperparameters(self, values):
+        for name, value in values.items():
+            if name == "step_size":
+                self.neural_net.step_size = value
+            elif name == "regulariser":
+                self.neural_net.regulariser = value
+            elif name in ("input_scale", "selectivity"):
+                setattr(self, name, value)
+            else:
+                raise ValueError("Unknown hyperparameter '{}'.".format(name))
+
+    def _predict(self, X):
         """
-        Obtain a move.
+        Evaluate states with the net, through the inference service if one
+        has been attached (see inference.InferenceService).
+        """
+        if self.inference_service is not None:
+            return self.inference_service.predict(X)
+        return self.neural_net.predict(X)
+
+    def _position_keys(self, states):
+        """
+        Cache keys for an array of states: their codes, or for a symmetry
+        invariant net the least code over their symmetric equivalents.
+        """
+        weights = NoughtsAndCrossesBoard.code_weights.ravel()
+        if self.neural_net.symmetry_maps is None:
+            return np.dot(np.mod(states, 3), weights).tolist()
+        images = np.mod(states[:,NoughtsAndCrossesBoard.symmetry_maps], 3)
+        return np.min(np.dot(images, weights), axis=1).tolist()
+
+    def _predict_states(self, states):
+        """
+        Net outputs (log probabilities) for an array of states, taken from
+        the value cache where possible. Only the states missing from the
+        cache are evaluated, in one batch.
+        """
+        if self.value_cache is None:
+            return self._predict(states/self.input_scale)
+        stamp = (self.neural_net.version, self.input_scale)
+        keys = self._position_keys(states)
+        log_prob = self.value_cache.lookup(stamp, keys)
+        missing = [ii for ii, lp in enumerate(log_prob) if lp is None]
+        if missing:
+            new_log_prob = self._predict(states[missing]/self.input_scale)
+            self.value_cache.store(stamp, [keys[ii] for ii in missing],
+                                   new_log_prob)
+            for ii, lp in zip(missing, new_log_prob):
+                log_prob[ii] = lp
+        return np.array(log_prob)
+
+    def _evaluate_options(self, board):
+        """
+        Find winning and blocking moves, and the afterstate resulting from
+        each legal move.
         """
         legal_moves = board.permitted_moves
-        log_prob = np.zeros((len(legal_moves),3))
         options = dict()
-        for st in self.strategies:
-            options[st] = []
+        options['win'] = board.winning_moves(board.turn).tolist()
+        options['block'] = board.winning_moves(-board.turn).tolist()
 
-        # Loop through the opponents possible moves
-        for mv in legal_moves:
-            bd = board.copy()
-            bd.turn = -bd.turn
-            bd.move(mv)
-
-            # See if they won (or if it was a draw)
-            if bd.over:
-                options['block'].append(mv)
-
-        # Loop through possible moves
-        for mm in range(len(legal_moves)):
-            mv = legal_moves[mm]
-            bd = board.copy()
-            bd.move(mv)
-
-            # See if we won (or it was a draw)
-            if bd.over:
-                options['win'].append(mv)
-
-            # Estimate probability of winning
-            state = bd.state.flatten()[np.newaxis,:]
-            log_prob[mm,:] = self.neural_net.predict(state/self.input_scale)
-            
-            #print("Log-probability of 0/+1/-1 victory if I make move {} "
-            #      "is {}/{}/{}.".format(state, *prob[mm,:]))
+        # The state after each legal move
+        afterstates = np.tile(board.state.flatten(), (len(legal_moves),1))
+        afterstates[np.arange(len(legal_moves)), legal_moves] = board.turn
 
-        # Decide which option to take
-        move = None
+        return legal_moves, options, afterstates
+
+    def _policy_moves(self, boards):
+        """
+        The most probable legal move under the policy head for each of a
+        list of boards, from a single forward pass.
+        """
+        turns = np.array([board.turn for board in boards])
+        states = np.array([board.state.flatten() for board in boards])
+        log_prob = self.neural_net.predict_policy(
+                            states*turns[:,None]/self.input_scale, states == 0)
+        return np.argmax(log_prob, axis=1).tolist()
+
+    def _tactical_move(self, options, rng):
+        """
+        Pick a move from the first strategy with any options, if there is one.
+        """
         for st in self.strategies:
             if options[st]:
-                move = np.random.choice(options[st])
-                break
+                return rng.choice(options[st])
+        return None
 
-        if move is None:
-            # Calculated expected return (+1 for win, -1 for loss, 0 for draw)
-            expct_return =  np.exp(log_prob[:,board.turn]) \
-                                - np.exp(log_prob[:,-board.turn])
+    @staticmethod
+    def _expected_return(log_prob, turn):
+        """
+        Calculated expected return (+1 for win, -1 for loss, 0 for draw)
+        """
+        return np.exp(log_prob[:,turn]) - np.exp(log_prob[:,-turn])
+
+    def move(self, board, session=None):
+        """
+        Obtain a move.
+        """
+        legal_moves, options, afterstates = self._evaluate_options(board)
+        rng = self._rng(session)
 
-            if (self.learning and (np.random.rand() < self.selectivity)):
-                move = np.random.choice(legal_moves)
+        # Decide which option to take
+        move = self._tactical_move(options, rng)
+        best_move = move
+
+        if (move is None) and self.neural_net.num_policy_outputs \
+                                                    and not self.learning:
+            move = best_move = self._policy_moves([board])[0]
+
+        elif move is None:
+            # Estimate probability of winning for every afterstate at once
+            log_prob = self._predict_states(afterstates)
+            expct_return = self._expected_return(log_prob, board.turn)
+            best_move = legal_moves[np.argmax(expct_return)]
+
+            if (self.learning and (rng.random() < self.selectivity)):
+                move = rng.choice(legal_moves)
             else:
-                move = legal_moves[np.argmax(expct_return)]
+                move = best_move
                 
             #select_prob = np.exp(expct_return/self.selectivity)
             #select_prob /= np.sum(select_prob)
-            #move = np.random.choice(legal_moves, p=select_prob)
-
-        # Store the board for learning later
-        board.move(move)
-        self._game_history.append(board.state.flatten())
+            #move = rng.choice(legal_moves, p=select_prob)
+
+        # Store the resulting state for learning later
+        if session is not None:
+            idx = np.flatnonzero(legal_moves == move)[0]
+            session.history[session.num_states,:] = afterstates[idx,:]
+            if self.neural_net.num_policy_outputs:
+                # The position from the mover's side, and the search's choice
+                session.positions[session.num_states,:] = \
+                                            board.turn*board.state.flatten()
+                session.moves[session.num_states] = best_move
+            session.num_states += 1
 
         return move
 
-    def learn(self, winner):
-        """
-        Update net.
-        """
-        if self.learning:
+    def afterstate_values(self, boards, moves):
+        """
+        Estimate the expected return (from the point of view of the player to
+        move) of making each of a list of moves on a list of boards.
+        """
+        afterstates = np.array([board.state.flatten() for board in boards],
+                               dtype=np.int8).reshape(len(boards), 9)
+        for bb in range(len(boards)):
+            if not boards[bb].verify(moves[bb]):
+                raise BoardgameError("That move is not valid")
+            afterstates[bb, moves[bb]] = boards[bb].turn
+        log_prob = self._predict_states(afterstates)
+        turns = np.array([board.turn for board in boards])
+        rows = np.arange(len(boards))
+        return np.exp(log_prob[rows,turns]) - np.exp(log_prob[rows,-turns])
+
+    def choose_moves(self, boards):
+        """
+        Choose a move for each of a list of boards without exploration or
+        learning. The afterstates of all the boards are scored in a single
+        forward pass through the net (or, once a player with a policy head
+        has stopped learning, the boards themselves through the policy head).
+        """
+        moves = [None]*len(boards)
+        pending = []
+        for bb in range(len(boards)):
+            legal_moves, options, afterstates = self._evaluate_options(
+                                                                    boards[bb])
+            moves[bb] = self._tactical_move(options, self.rng)
+            if moves[bb] is None:
+                pending.append((bb, legal_moves, afterstates))
+
+        if pending and self.neural_net.num_policy_outputs \
+                                                    and not self.learning:
+            policy_moves = self._policy_moves([boards[pnd[0]]
+                                               for pnd in pending])
+            for (bb, _, _), move in zip(pending, policy_moves):
+                moves[bb] = move
+
+        elif pending:
+            all_afterstates = np.vstack([pnd[2] for pnd in pending])
+            log_prob = self._predict_states(all_afterstates)
+            offset = 0
+            for bb, legal_moves, afterstates in pending:
+                num = len(legal_moves)
+                expct_return = self._expected_return(
+                        log_prob[offset:offset+num,:], boards[bb].turn)
+                moves[bb] = legal_moves[np.argmax(expct_return)]
+                offset += num
+
+        return moves
+
+    def learn(self, winner, history, positions=None, moves=None):
+        """
+        Update net from an array of the states seen in a game, and for a net
+        with a policy head, the positions the player moved from (seen from
+        its side) and the moves its search picked in them. Nothing is learnt
+        from a game which ended (e.g. by forfeit) before the player moved.
+        """
+        if self.learning and len(history):
             # Parse the game history to make training data
-            states = np.array(self._game_history)
-            states = self.symmetric_equivalents(states)
+            states = history
+            if self.neural_net.symmetry_maps is None:
+                states = self.symmetric_equivalents(states)
             outputs = winner*np.ones(states.shape[0], dtype=int)
 
+            policy_data = dict()
+            if (positions is not None) and len(positions):
+                if self.neural_net.symmetry_maps is None:
+                    positions, moves = self.symmetric_policy_equivalents(
+                                                            positions, moves)
+                policy_data = dict(policy_X=positions/self.input_scale,
+                                   policy_targets=moves,
+                                   policy_mask=(positions == 0))
+
             # Update the net
-            self.neural_net.update(states/self.input_scale, outputs)
+            self.neural_net.update(states/self.input_scale, outputs,
+                                   **policy_data)
 
-    def notify(self, event, info):
+    def new_session(self, game_id):
         """
-        Act on an event notification from the game.
+        Create the per-game state for a new game: a buffer for the game
+        history, big enough for the longest possible game.
         """
-        if (event == "begin"):
-            self._game_history = []
-        elif (event == "finish"):
-            self.learn(info)
+        session = Player.new_session(self, game_id)
+        session.history = np.zeros((NoughtsAndCrossesBoard.max_moves,9),
+                                   dtype=np.int8)
+        session.num_states = 0
+        if self.neural_net.num_policy_outputs:
+            session.positions = np.zeros_like(session.history)
+            session.moves = np.zeros(NoughtsAndCrossesBoard.max_moves,
+                                     dtype=int)
+        return session
+
+    def begin_game(self, event):
+        """
+        Clear the history at the start of a game.
+        """
+        self.session(event.game_id).num_states = 0
+
+    def finish_game(self, event):
+        """
+        Learn from the game once it is over.
+        """
+        session = self.session(event.game_id)
+        num_states = session.num_states
+        if self.neural_net.num_policy_outputs:
+            self.learn(event.result, session.history[:num_states],
+                       session.positions[:num_states],
+                       session.moves[:num_states])
         else:
-            pass
+            self.learn(event.result, session.history[:num_states])
 
     def symmetric_equivalents(self, states):
         """
@@ -537,6 +850,18 @@ class LearningNoughtsAndCrossesPlayer(Player):
                     states = np.vstack((states, sym))
         return states
 
+    def symmetric_policy_equivalents(self, positions, moves):
+        """
+        Add the reflections and rotations of an array of positions, with the
+        correspondingly mapped moves.
+        """
+        maps = NoughtsAndCrossesBoard.symmetry_maps
+        # Cell j of position[maps[k]] is cell maps[k,j] of the position
+        inverse = np.argsort(maps, axis=1)
+        all_positions = positions[:,maps].reshape(-1, positions.shape[1])
+        all_moves = inverse[:,moves].T.ravel()
+        return all_positions, all_moves
+
     def symmetries(self, state):
         """
         Make a list of all the states obtainable by reflecting or rotating
@@ -546,3 +871,85 @@ class LearningNoughtsAndCrossesPlayer(Player):
         for ii in range(7):
             syms.append(state[self.symmetry_maps[ii,:]])
         return syms
+
+
+class TableNoughtsAndCrossesPlayer(Player):
+    """
+    A computer player for noughts and crosses which plays from a lookup table
+    of moves indexed by board code, e.g. one compiled from a trained learning
+    player with analysis.compile_policy.
+    """
+    def __init__(self, name, moves, values=None):
+        """
+        Create the player from a table of moves (-1 where no move is stored)
+        and, optionally, the estimated value of each stored move.
+        """
+        Player.__init__(self, name)
+        self.moves = np.asarray(moves, dtype=np.int8)
+        if values is None:
+            values = np.full(self.moves.shape, np.nan, dtype=np.float32)
+        self.values = np.asarray(values, dtype=np.float32)
+        if self.moves.shape != (NoughtsAndCrossesBoard.num_codes,):
+            raise BoardgameError("Move table must have an entry for every "
+                                 "board code.")
+
+    def move(self, board, session=None):
+        """
+        Look up a move.
+        """
+        move = self.moves[board.code]
+        if move < 0:
+            raise BoardgameError("No move stored for this position.")
+        return int(move)
+
+    def choose_moves(self, boards):
+        """
+        Look up a move for each of a list of boards.
+        """
+        return [self.move(board) for board in boards]
+
+    def save(self, filename):
+        """
+        Save the table to a .npz file.
+        """
+        np.savez(filename, moves=self.moves, values=self.values)
+
+    @classmethod
+    def load(cls, name, filename):
+        """
+        Create a player from a table saved with save.
+        """
+        with np.load(filename) as data:
+            return cls(name, data['moves'], data['values'])
+
+
+# Player kinds which can be named in a specification of the form kind[:name]
+# (or table:file.npz), with each kind's class and default name
+PLAYER_KINDS = {"human": (HumanNoughtsAndCrossesPlayer, "Human"),
+                "dumb": (DumbNoughtsAndCrossesPlayer, "Colin"),
+                "naive": (NaiveNoughtsAndCrossesPlayer, "Hubert"),
+                "expert": (ExpertNoughtsAndCrossesPlayer, "Horatio"),
+                "learning": (LearningNoughtsAndCrossesPlayer, "Franklin"),
+                "table": (TableNoughtsAndCrossesPlayer, "Tabitha")}
+
+def make_player(spec, suffix="", rng=None):
+    """
+    Create a player from a specification of the form kind[:name], or
+    table:file.npz for a compiled table player. rng may be a seed,
+    SeedSequence or numpy Generator.
+    """
+    kind, _, arg = spec.partition(":")
+    if kind not in PLAYER_KINDS:
+        raise BoardgameError("Unknown player kind '{}'.".format(kind))
+    cls, default_name = PLAYER_KINDS[kind]
+    if kind == "table":
+        return cls.load(default_name+suffix, arg)
+    return cls((arg or default_name)+suffix, rng)
+
+def make_players(specs, seeds, suffixes=False):
+    """
+    Create players, each with its own random stream spawned from seeds.
+    """
+    rngs = spawn_rngs(seeds, len(specs))
+    return [make_player(spec, " ({})".format(ii+1) if suffixes else "",
+                        rngs[ii]) for ii, spec in enumerate(specs)]
@@ -0,0 +1,245 @@
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+import json
+import math
+import os
+
+import numpy as np
+
+from boardgame import make_seed_sequence, spawn_rngs
+from noughtsandcrosses import (NoughtsAndCrossesGame,
+                               LearningNoughtsAndCrossesPlayer, make_players)
+from training import evaluate_player, freeze
+
+
+# Every setting of a population-based training run. Hyperparameters are
+# given as [low, high] ranges for the initial population, sampled
+# log-uniformly (or uniformly if low is zero).
+DEFAULT_CONFIG = {
+    "name": "Franklin",
+    "population_size": 8,
+    "num_workers": None,
+    "rounds": 10,
+    "games_per_round": 200,
+    "eval_games": 100,
+    "opponents": ["expert", "naive"],
+    "evaluators": ["expert", "naive"],
+    "num_hidden_units": 250,
+    "invariant": False,
+    "hyperparameters": {"step_size": [3E-2, 1.0],
+                        "regulariser": [3E-3, 3E-1],
+                        "input_scale": [4.0, 32.0],
+                        "selectivity": [0.0, 0.1]},
+    "exploit_fraction": 0.25,
+    "perturb_factors": [0.8, 1.25],
+    "seed": None,
+    }
+
+def load_config(filename=None, **overrides):
+    """
+    Read a JSON config file, filling in anything it leaves out from
+    DEFAULT_CONFIG, then apply any keyword overrides.
+    """
+    config = deepcopy(DEFAULT_CONFIG)
+    if filename is not None:
+        with open(filename) as config_file:
+            settings = json.load(config_file)
+        unknown = set(settings) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError("Unknown config settings: {}.".format(
+                                                ", ".join(sorted(unknown))))
+        config.update(settings)
+    config.update(overrides)
+    return config
+
+
+def train_member(player, opponents, evaluators, num_games, num_eval_games,
+                 random_state=None):
+    """
+    Train a population member for a round, taking the opponents in turn, then
+    score a frozen copy of it against each of the evaluators. The score is
+    the mean over evaluators of the win rate minus the loss rate. This is a
+    module-level function so that it can be run in a worker process. Returns
+    the trained player and its score.
+    """
+    train_seed, eval_seed = make_seed_sequence(random_state).spawn(2)
+    for ii, rng in enumerate(spawn_rngs(train_seed, num_games)):
+        game = NoughtsAndCrossesGame([player, opponents[ii % len(opponents)]],
+                                     verbosity=0, rng=rng)
+        game.play_game()
+
+    frozen = freeze(player)
+    scores = []
+    for evaluator, seed in zip(evaluators, eval_seed.spawn(len(evaluators))):
+        wins, draws, losses = evaluate_player(frozen, evaluator,
+                                              num_eval_games, seed)
+        scores.append((wins - losses)/num_eval_games)
+    return player, float(np.mean(scores))
+
+
+class Member:
+    """
+    A member of the population: a learner, its latest score, and a record of
+    the members it has copied.
+    """
+    def __init__(self, index, player):
+        """
+        Create the member.
+        """
+        self.index = index
+        self.player = player
+        self.score = None
+        self.scores = []
+        self.lineage = []
+
+
+class PopulationTrainer:
+    """
+    Population-based training of learning noughts and crosses players. Each
+    round, every member of the population trains for games_per_round games
+    in a pool of worker processes and is then scored against the evaluators.
+    The worst exploit_fraction of the population then copy the weights and
+    hyperparameters of randomly chosen members of the best exploit_fraction,
+    and explore by multiplying each hyperparameter by one of
+    perturb_factors. The run is driven entirely by a config (see
+    DEFAULT_CONFIG and load_config), and is reproducible from its seed.
+    """
+    def __init__(self, config=None, verbosity=1):
+        """
+        Create the initial population.
+        """
+        if config is None:
+            config = load_config()
+        self.config = config
+        self.verbosity = verbosity
+        self.seed_sequence = make_seed_sequence(config["seed"])
+        player_seeds, opponent_seeds, rng_seed = self.seed_sequence.spawn(3)
+        self.rng = np.random.default_rng(rng_seed)
+
+        opponent_seed, evaluator_seed = opponent_seeds.spawn(2)
+        self.opponents = make_players(config["opponents"], opponent_seed)
+        self.evaluators = make_players(config["evaluators"], evaluator_seed,
+                                       suffixes=True)
+
+        self.members = []
+        for ii, seed in enumerate(player_seeds.spawn(
+                                                config["population_size"])):
+            player = LearningNoughtsAndCrossesPlayer(
+                                "{} {}".format(config["name"], ii), seed,
+                                invariant=config["invariant"],
+                                num_hidden_units=config["num_hidden_units"])
+            player.hyperparameters = self._sample_hyperparameters()
+            self.members.append(Member(ii, player))
+        self.rounds_completed = 0
+
+    def _announce(self, message, v=1):
+        """
+        Make an announcement
+        """
+        if (v <= self.verbosity):
+            print(message)
+
+    def _sample_hyperparameters(self):
+        """
+        Draw hyperparameters for a new member from the configured ranges.
+        """
+        values = dict()
+        for name, (low, high) in self.config["hyperparameters"].items():
+            if low > 0:
+                values[name] = math.exp(self.rng.uniform(math.log(low),
+                                                         math.log(high)))
+            else:
+                values[name] = self.rng.uniform(low, high)
+        return values
+
+    def _perturb(self, hyperparameters):
+        """
+        Multiply each hyperparameter by a randomly chosen perturbation factor.
+        """
+        values = dict()
+        for name, value in hyperparameters.items():
+            values[name] = value*self.rng.choice(
+                                            self.config["perturb_factors"])
+        if "selectivity" in values:
+            values["selectivity"] = min(values["selectivity"], 1.0)
+        return values
+
+    def _exploit_and_explore(self):
+        """
+        Replace the worst members by perturbed copies of the best.
+        """
+        ranked = self.ranking()
+        num_replaced = int(math.ceil(self.config["exploit_fraction"]
+                                     * len(ranked)))
+        num_replaced = min(num_replaced, len(ranked)//2)
+        if num_replaced == 0:
+            return
+        best = ranked[:num_replaced]
+        for member in ranked[-num_replaced:]:
+            source = best[self.rng.integers(len(best))]
+            player = freeze(source.player, member.player.name)
+            player.learning = True
+            player.hyperparameters = self._perturb(
+                                            source.player.hyperparameters)
+            member.player = player
+            member.lineage.append((self.rounds_completed, source.index))
+            self._announce("  {} copies {}.".format(member.player.name,
+                                                    source.player.name), v=2)
+
+    def ranking(self):
+        """
+        Members in order of their latest score, best first, with ties broken
+        by the mean of their scores so far.
+        """
+        return sorted(self.members, key=lambda mm: (
+                        -np.inf if mm.score is None else mm.score,
+                        np.mean(mm.scores) if mm.scores else -np.inf),
+                      reverse=True)
+
+    def leaderboard(self):
+        """
+        Table of the members' latest scores and hyperparameters, best first.
+        """
+        names = sorted(self.config["hyperparameters"])
+        lines = ["{:>4} {:>16} {:>7} ".format("rank", "player", "score")
+                 + " ".join("{:>12}".format(name) for name in names)]
+        for rank, member in enumerate(self.ranking()):
+            hyperparameters = member.player.hyperparameters
+            score = "" if member.score is None else \
+                                            "{:7.3f}".format(member.score)
+            lines.append("{:>4} {:>16} {:>7} ".format(rank+1,
+                                                member.player.name, score)
+                         + " ".join("{:12.4g}".format(hyperparameters[name])
+                                    for name in names))
+        return "\n".join(lines)
+
+    @property
+    def best_player(self):
+        """
+        The member with the best latest score.
+        """
+        return self.ranking()[0].player
+
+    def run(self):
+        """
+        Train for the configured number of rounds. Returns the leaderboard.
+        """
+        num_workers = self.config["num_workers"] or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            for _ in range(self.config["rounds"]):
+                round_seeds = self.seed_sequence.spawn(1)[0].spawn(
+                                                            len(self.members))
+                futures = [executor.submit(train_member, member.player,
+                                           self.opponents, self.evaluators,
+                                           self.config["games_per_round"],
+                                           self.config["eval_games"], seed)
+                           for member, seed in zip(self.members, round_seeds)]
+                for member, future in zip(self.members, futures):
+                    member.player, member.score = future.result()
+                    member.scores.append(member.score)
+                self.rounds_completed += 1
+                self._announce("After round {}:\n{}".format(
+                                    self.rounds_completed, self.leaderboard()))
+                if self.rounds_completed < self.config["rounds"]:
+                    self._exploit_and_explore()
+        return self.leaderboard()
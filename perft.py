@@ -0,0 +1,88 @@
+from collections import namedtuple
+import time
+
+from boardgame import BoardgameError
+
+
+def perft(board, depth):
+    """
+    Count the leaf nodes of the game tree below board, searching depth moves
+    ahead. A leaf is either a position depth moves on or a finished game, so
+    searching past the end of the game counts every complete game. Only the
+    board's public move API is used (permitted_moves, move, and unmove if the
+    board has it, otherwise copy), so this works for any board class. The
+    board is left as it was.
+    """
+    if board.over or (depth == 0):
+        return 1
+    if not hasattr(board, 'unmove'):
+        nodes = 0
+        for mv in board.permitted_moves:
+            child = board.copy()
+            child.move(mv)
+            nodes += perft(child, depth-1)
+        return nodes
+
+    nodes = 0
+    for mv in board.permitted_moves:
+        board.move(mv)
+        nodes += perft(board, depth-1)
+        board.unmove(mv)
+    return nodes
+
+
+# Leaf counts from the starting position, keyed on board class name and
+# depth. 255168 is the number of distinct complete noughts and crosses games.
+KNOWN_COUNTS = {
+    'NoughtsAndCrossesBoard': {1: 9, 2: 72, 3: 504, 4: 3024, 5: 15120,
+                               6: 56160, 7: 154944, 8: 255168, 9: 255168},
+    'UltimateNoughtsAndCrossesBoard': {1: 81, 2: 720, 3: 6336, 4: 55080,
+                                       5: 473256},
+    }
+
+
+class PerftResult(namedtuple('PerftResult', ['depth', 'nodes', 'seconds',
+                                             'expected'])):
+    """
+    Result of a perft run. expected is the known leaf count, or None if
+    there isn't one.
+    """
+    @property
+    def nodes_per_second(self):
+        """
+        Leaf nodes counted per second.
+        """
+        return self.nodes/max(self.seconds, 1E-9)
+
+    @property
+    def correct(self):
+        """
+        Whether the count matches the known total (None if there isn't one).
+        """
+        if self.expected is None:
+            return None
+        return self.nodes == self.expected
+
+
+def run_perft(board_class, depth, check=True):
+    """
+    Time perft from the starting position of board_class. If check is set,
+    raise a BoardgameError when the count differs from a known total.
+    """
+    board = board_class()
+    start = time.perf_counter()
+    nodes = perft(board, depth)
+    seconds = time.perf_counter() - start
+    known = KNOWN_COUNTS.get(board_class.__name__, dict())
+    # Counts stop changing once every game has finished
+    if (depth not in known) and known and \
+                            (depth > max(known)) and (depth >= board.max_moves):
+        expected = known[max(known)]
+    else:
+        expected = known.get(depth)
+    result = PerftResult(depth, nodes, seconds, expected)
+    if check and (result.correct is False):
+        raise BoardgameError("perft({}) on {} counted {} nodes, expected "
+                             "{}".format(depth, board_class.__name__, nodes,
+                                         expected))
+    return result
@@ -0,0 +1,254 @@
+from abc import ABCMeta, abstractmethod
+from itertools import combinations, product
+import os
+import tempfile
+
+import numpy as np
+
+
+# Table entry for codes which are not positions (e.g. the wrong number of
+# pieces). Solved positions hold +1 (X wins), 0 (draw) or -1 (O wins).
+UNKNOWN = -128
+
+
+def k_in_a_row_lines(num_rows, num_cols, k):
+    """
+    Array of the cells (numbered row*num_cols + col) in every horizontal,
+    vertical and diagonal line of k cells on a num_rows x num_cols grid.
+    """
+    lines = []
+    for rr, cc in product(range(num_rows), range(num_cols)):
+        for dr, dc in ((0,1), (1,0), (1,1), (1,-1)):
+            end_r, end_c = rr + (k-1)*dr, cc + (k-1)*dc
+            if (0 <= end_r < num_rows) and (0 <= end_c < num_cols):
+                lines.append([(rr + ii*dr)*num_cols + (cc + ii*dc)
+                              for ii in range(k)])
+    return np.array(lines, dtype=int)
+
+
+class PositionSpace(metaclass=ABCMeta):
+    """
+    Vectorised description of the positions of a two-player game in which
+    each move adds a piece (X moves first), for retrograde analysis.
+    Positions are handled in bulk as NxC int8 arrays of cells (+1 X, -1 O,
+    0 empty) and as integer codes in range(num_codes) indexing the solution
+    table. Subclasses supply position enumeration (occupancies), the code
+    (encode) and unmove generation (removable).
+    """
+    num_cells = None
+    num_codes = None
+    lines = None
+
+    @abstractmethod
+    def occupancies(self, num_pieces):
+        """
+        MxC boolean array of the sets of occupied cells possible with
+        num_pieces pieces on the board.
+        """
+        pass
+
+    @abstractmethod
+    def encode(self, cells):
+        """
+        Codes of an NxC array of positions.
+        """
+        pass
+
+    @abstractmethod
+    def removable(self, cells):
+        """
+        NxC boolean array of the pieces which could have been the last one
+        placed in each position.
+        """
+        pass
+
+    def layer(self, num_pieces):
+        """
+        Every position with num_pieces pieces (X having moved first), as an
+        array of cells sorted by code, and the codes.
+        """
+        occupied = self.occupancies(num_pieces)
+        num_x = (num_pieces + 1)//2
+        cell_lists = np.array([np.flatnonzero(occ) for occ in occupied],
+                              dtype=int).reshape(len(occupied), num_pieces)
+        choices = list(combinations(range(num_pieces), num_x))
+        x_choices = np.array(choices, dtype=int).reshape(len(choices), num_x)
+
+        cells = np.zeros((len(occupied), len(x_choices), self.num_cells),
+                         dtype=np.int8)
+        rows = np.arange(len(occupied))[:,None]
+        cells[rows, :, cell_lists] = -1
+        x_cells = cell_lists[:,x_choices]
+        cells[rows[:,:,None], np.arange(len(x_choices))[None,:,None],
+              x_cells] = 1
+        cells = cells.reshape(-1, self.num_cells)
+
+        codes = self.encode(cells)
+        order = np.argsort(codes)
+        return cells[order], codes[order]
+
+    @property
+    def start_code(self):
+        """
+        Code of the empty board.
+        """
+        return int(self.encode(np.zeros((1, self.num_cells), dtype=np.int8))[0])
+
+    def winners(self, cells, last_mover):
+        """
+        The side (+1/-1) with a complete line in each position, or 0 if
+        neither has. If both have (which cannot arise in play), the side
+        which moved last is taken to have won.
+        """
+        line_cells = cells[:,self.lines]
+        x_line = np.any(np.all(line_cells == 1, axis=2), axis=1)
+        o_line = np.any(np.all(line_cells == -1, axis=2), axis=1)
+        winners = x_line.astype(np.int8) - o_line.astype(np.int8)
+        both = x_line & o_line
+        winners[both] = last_mover
+        return winners
+
+
+class KInARowPositions(PositionSpace):
+    """
+    Positions of k-in-a-row on a num_rows x num_cols board, such as 4x4
+    noughts and crosses with k=4. Codes are base 3 with each cell
+    contributing 0 (empty), 1 (X) or 2 (O), so for the 3x3 board they match
+    NoughtsAndCrossesBoard.code.
+    """
+    def __init__(self, num_rows=3, num_cols=3, k=3):
+        """
+        Set up the space.
+        """
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.k = k
+        self.num_cells = num_rows*num_cols
+        self.num_codes = 3**self.num_cells
+        self.lines = k_in_a_row_lines(num_rows, num_cols, k)
+        self.code_weights = 3**np.arange(self.num_cells, dtype=np.int64)
+
+    def occupancies(self, num_pieces):
+        sets = list(combinations(range(self.num_cells), num_pieces))
+        occupied = np.zeros((len(sets), self.num_cells), dtype=bool)
+        for ii, cell_set in enumerate(sets):
+            occupied[ii, list(cell_set)] = True
+        return occupied
+
+    def encode(self, cells):
+        return np.dot(np.mod(cells, 3).astype(np.int64), self.code_weights)
+
+    def removable(self, cells):
+        return cells != 0
+
+
+class ConnectFourPositions(PositionSpace):
+    """
+    Positions of Connect Four (k in a row, with pieces dropped into columns)
+    on a board num_cols wide and num_rows high. Cells are numbered
+    row*num_cols + col from the bottom row. Each column is coded as
+    2**height - 1 plus a bit per piece (set for O), and the board as those
+    column codes in base 2**(num_rows+1) - 1, which is far more compact
+    than base 3 per cell.
+    """
+    def __init__(self, num_cols=5, num_rows=4, k=4):
+        """
+        Set up the space.
+        """
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.k = k
+        self.num_cells = num_rows*num_cols
+        self.column_radix = 2**(num_rows+1) - 1
+        self.num_codes = self.column_radix**num_cols
+        self.lines = k_in_a_row_lines(num_rows, num_cols, k)
+        self.column_weights = self.column_radix**np.arange(num_cols,
+                                                           dtype=np.int64)
+
+    def occupancies(self, num_pieces):
+        heights = [hh for hh in product(range(self.num_rows+1),
+                                        repeat=self.num_cols)
+                   if sum(hh) == num_pieces]
+        occupied = np.zeros((len(heights), self.num_rows, self.num_cols),
+                            dtype=bool)
+        for ii, hh in enumerate(heights):
+            occupied[ii] = np.arange(self.num_rows)[:,None] < np.array(hh)
+        return occupied.reshape(len(heights), self.num_cells)
+
+    def encode(self, cells):
+        grid = cells.reshape(-1, self.num_rows, self.num_cols)
+        heights = np.count_nonzero(grid, axis=1).astype(np.int64)
+        bits = np.dot((grid == -1).transpose(0,2,1).astype(np.int64),
+                      2**np.arange(self.num_rows, dtype=np.int64))
+        return np.dot(2**heights - 1 + bits, self.column_weights)
+
+    def removable(self, cells):
+        grid = cells.reshape(-1, self.num_rows, self.num_cols) != 0
+        above = np.zeros_like(grid)
+        above[:,:-1,:] = grid[:,1:,:]
+        return (grid & ~above).reshape(-1, self.num_cells)
+
+
+def retrograde_solve(space, filename=None, chunk_size=1<<16, verbosity=0):
+    """
+    Solve every position of a PositionSpace by retrograde analysis, working
+    back one layer (number of pieces) at a time from the full board. Each
+    layer is enumerated as arrays of cells and codes. Its terminal positions
+    are scored directly, and the rest take the best value over their
+    children, found by generating the unmoves of every position in the layer
+    above. Only two layers are held in memory.
+
+    Values (+1 X wins, 0 draw, -1 O wins, UNKNOWN for codes that are not
+    positions) are written to an int8 np.memmap table of space.num_codes
+    entries, stored in filename (a temporary file if not given), which is
+    returned opened read-only.
+    """
+    if filename is None:
+        handle, filename = tempfile.mkstemp(suffix=".table")
+        os.close(handle)
+    table = np.memmap(filename, dtype=np.int8, mode="w+",
+                      shape=(space.num_codes,))
+    table[:] = UNKNOWN
+
+    children = None
+    for num_pieces in reversed(range(space.num_cells+1)):
+        cells, codes = space.layer(num_pieces)
+        side = 1 if (num_pieces % 2) == 0 else -1
+        values = space.winners(cells, -side)
+        terminal = values != 0
+        if num_pieces == space.num_cells:
+            terminal[:] = True
+        else:
+            # Best value for the side to move over each position's children
+            best = np.full(len(codes), -2, dtype=np.int8)
+            child_cells, child_codes = children
+            for start in range(0, len(child_codes), chunk_size):
+                chunk = child_cells[start:start+chunk_size]
+                child_values = table[child_codes[start:start+chunk_size]]
+                rows, cols = np.nonzero(space.removable(chunk)
+                                        & (chunk == side))
+                parents = chunk[rows]
+                parents[np.arange(len(rows)), cols] = 0
+                parent_idx = np.searchsorted(codes, space.encode(parents))
+                np.maximum.at(best, parent_idx, side*child_values[rows])
+            if np.any(best[~terminal] == -2):
+                raise ValueError("Unsolved positions with {} pieces: the "
+                                 "position space is inconsistent.".format(
+                                                                num_pieces))
+            values[~terminal] = side*best[~terminal]
+        table[codes] = values
+        children = (cells, codes)
+        if verbosity > 0:
+            print("Solved {} positions with {} pieces.".format(len(codes),
+                                                               num_pieces))
+
+    table.flush()
+    del table
+    return load_table(space, filename)
+
+def load_table(space, filename):
+    """
+    Open a solution table written by retrograde_solve, read-only.
+    """
+    return np.memmap(filename, dtype=np.int8, mode="r",
+                     shape=(space.num_codes,))
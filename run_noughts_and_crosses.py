@@ -1,5 +1,6 @@
+import sys
+
 import numpy as np
-from matplotlib import pyplot as plt
 
 from boardgame import BoardgameError
 from noughtsandcrosses import (NoughtsAndCrossesGame,
@@ -8,8 +9,9 @@ from noughtsandcrosses import (NoughtsAndCrossesGame,
                                NaiveNoughtsAndCrossesPlayer,
                                LearningNoughtsAndCrossesPlayer,
                                ExpertNoughtsAndCrossesPlayer)
+from training import OpponentCurriculum
 
-np.random.seed(seed=5)
+rng = np.random.default_rng(5)
 
 #player1 = HumanNoughtsAndCrossesPlayer("Pete")
 #player2 = HumanNoughtsAndCrossesPlayer("Katy")
@@ -19,61 +21,76 @@ np.random.seed(seed=5)
 #player1 = ExpertNoughtsAndCrossesPlayer("Horatio")
 #player2 = LearningNoughtsAndCrossesPlayer("Franklin")
 
-player = LearningNoughtsAndCrossesPlayer("Franklin")
+player = LearningNoughtsAndCrossesPlayer("Franklin", rng)
 #opponents = [ExpertNoughtsAndCrossesPlayer("Horatio")]
 opponents = [ExpertNoughtsAndCrossesPlayer("Horatio"),
                 NaiveNoughtsAndCrossesPlayer("Hubert")]
 
-result = []
+# Opponents are picked by Franklin's recent loss rate against each, and
+# frozen copies of Franklin join the pool as training goes on
+curriculum = OpponentCurriculum(opponents, strategy="loss",
+                                snapshot_interval=250)
 
 num_games = 1000
 num_eval = int(num_games/10)
 
-idx = 1
+# Results go in the net's bounded telemetry sink alongside the training cost,
+# with the first num_eval tallied separately
+telemetry = player.neural_net.telemetry
+first_results = np.zeros(3, dtype=int)
+
 for gg in range(num_games):
     if (((gg+1)%100) == 0):
         print("Played {} of {} games.".format(gg+1, num_games))
-    #if gg > 500:
-    #    idx = 1 - idx
-    #if ((gg+1)%50) == 0:
-    #    idx = 1 - idx
-    #idx = 1 - idx
-    game = NoughtsAndCrossesGame([player,opponents[idx]], verbosity=0)
-    #game = NoughtsAndCrossesGame([player1, player2], verbosity=0)
+    opponent = curriculum.sample(rng)
+    game = NoughtsAndCrossesGame([player, opponent], verbosity=0, rng=rng)
+    #game = NoughtsAndCrossesGame([player1, player2], verbosity=0, rng=rng)
     game.play_game()
     if game.winner == "Franklin":
-        result.append(1)
+        result = 1
     elif game.winner == "Draw":
-        result.append(0)
+        result = 0
     else:
-        result.append(-1)
+        result = -1
+    telemetry.record("result", result)
+    if gg < num_eval:
+        first_results[result+1] += 1
+    curriculum.record(opponent, result)
+    if ((gg+1) % curriculum.snapshot_interval) == 0:
+        curriculum.add_snapshot(player, gg+1)
 
 #    if game.winner == "Franklin":
 #        raise BoardgameError("Horatio should be unbeatable!!")
 
     
+print("Opponent probabilities: {}".format(curriculum))
+last_results = telemetry.recent("result")[1][-num_eval:]
 print("Franklin won {}\% of the first {} games.".format(
-                    100*np.mean(np.array(result[:num_eval]) == 1), num_eval))
+                    100*first_results[2]/num_eval, num_eval))
 print("Franklin drew {}\% of the first {} games.".format(
-                    100*np.mean(np.array(result[:num_eval]) == 0), num_eval))
+                    100*first_results[1]/num_eval, num_eval))
 
 print("Franklin won {}\% of the last {} games.".format(
-                    100*np.mean(np.array(result[-num_eval:]) == 1), num_eval))
+                    100*np.mean(last_results == 1), num_eval))
 print("Franklin drew {}\% of the last {} games.".format(
-                    100*np.mean(np.array(result[-num_eval:]) == 0), num_eval))
+                    100*np.mean(last_results == 0), num_eval))
 
-fig = plt.figure()
-ax = fig.add_subplot(1,1,1)
-ax.plot(result)
-plt.show()
+# Plotting is opt-in, so that headless runs never import matplotlib
+if "--plot" in sys.argv:
+    from matplotlib import pyplot as plt
 
-result = np.array(result)
-cost = np.array(player.neural_net.cost_sequence)
+    # One update per game, so the downsampled histories line up
+    steps, result = telemetry.history("result")
+    cost = telemetry.history("cost")[1]
 
-fig = plt.figure()
-ax = fig.add_subplot(1,1,1)
-ax.plot(np.where(result==1)[0], cost[result==1],'g')
-ax.plot(np.where(result==0)[0], cost[result==0],'b')
-ax.plot(np.where(result==-1)[0],cost[result==-1],'r')
-plt.show()
+    fig = plt.figure()
+    ax = fig.add_subplot(1,1,1)
+    ax.plot(steps, result)
+    plt.show()
 
+    fig = plt.figure()
+    ax = fig.add_subplot(1,1,1)
+    ax.plot(steps[result==1], cost[result==1],'g')
+    ax.plot(steps[result==0], cost[result==0],'b')
+    ax.plot(steps[result==-1],cost[result==-1],'r')
+    plt.show()
@@ -0,0 +1,229 @@
+import csv
+import os
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    The most recent capacity samples of a series, as (step, value) pairs.
+    """
+    def __init__(self, capacity):
+        """
+        Create an empty buffer.
+        """
+        self.capacity = capacity
+        self._steps = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros(capacity)
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, step, value):
+        """
+        Add a sample, overwriting the oldest if the buffer is full.
+        """
+        ii = self._count % self.capacity
+        self._steps[ii] = step
+        self._values[ii] = value
+        self._count += 1
+
+    def _order(self):
+        """
+        Indices of the samples held, oldest first.
+        """
+        if self._count <= self.capacity:
+            return np.arange(self._count)
+        start = self._count % self.capacity
+        return np.roll(np.arange(self.capacity), -start)
+
+    @property
+    def steps(self):
+        return self._steps[self._order()]
+
+    @property
+    def values(self):
+        return self._values[self._order()]
+
+
+class Reservoir:
+    """
+    A downsampled record of a whole series in bounded memory. Every stride-th
+    sample is kept. When capacity samples are held, every other one is
+    dropped and the stride doubles, so the record always spans the whole run
+    at an even spacing.
+    """
+    def __init__(self, capacity):
+        """
+        Create an empty reservoir.
+        """
+        self.capacity = capacity
+        self.stride = 1
+        self._steps = []
+        self._values = []
+        self._count = 0
+
+    def __len__(self):
+        return len(self._steps)
+
+    def append(self, step, value):
+        """
+        Offer a sample, which is kept if it falls on the current stride.
+        """
+        if (self._count % self.stride) == 0:
+            if len(self._steps) >= self.capacity:
+                self._steps = self._steps[::2]
+                self._values = self._values[::2]
+                self.stride *= 2
+            if (self._count % self.stride) == 0:
+                self._steps.append(step)
+                self._values.append(value)
+        self._count += 1
+
+    @property
+    def steps(self):
+        return np.array(self._steps, dtype=np.int64)
+
+    @property
+    def values(self):
+        return np.array(self._values)
+
+
+class Metric:
+    """
+    Running count, total and latest value of a series, with its recent
+    samples in a ring buffer and a downsampled history of the whole run.
+    """
+    def __init__(self, capacity, history_size):
+        """
+        Start with no samples.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.last = None
+        self.recent = RingBuffer(capacity)
+        self.history = Reservoir(history_size)
+
+    def append(self, step, value):
+        """
+        Add a sample.
+        """
+        self.count += 1
+        self.total += value
+        self.last = value
+        self.recent.append(step, value)
+        self.history.append(step, value)
+
+    @property
+    def mean(self):
+        """
+        Mean over the whole run.
+        """
+        return self.total/max(self.count, 1)
+
+    @property
+    def recent_mean(self):
+        """
+        Mean over the samples in the ring buffer.
+        """
+        if len(self.recent) == 0:
+            return np.nan
+        return np.mean(self.recent.values)
+
+
+class Telemetry:
+    """
+    Bounded sink for training metrics (cost, gradient norms, update times,
+    game results and so on), which can be read while a run is in progress.
+    Each named metric keeps its last capacity samples and a downsampled
+    history of history_size samples, so memory use does not grow with the
+    length of the run.
+
+    If filename is given, every sample is also written out in chunks of
+    flush_interval: appended to it if it ends in .csv (with columns metric,
+    step, value), or otherwise saved as a numbered series of .npz files
+    alongside it. Call flush at the end of a run to write the last chunk.
+    """
+    def __init__(self, capacity=1000, history_size=1000, filename=None,
+                 flush_interval=1000):
+        """
+        Create the sink.
+        """
+        self.capacity = capacity
+        self.history_size = history_size
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.metrics = dict()
+        self.num_flushes = 0
+        self._pending = []
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+    def __contains__(self, name):
+        return name in self.metrics
+
+    def record(self, name, value, step=None):
+        """
+        Record a sample of a metric. step defaults to the number of samples
+        of that metric recorded so far.
+        """
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = Metric(self.capacity,
+                                                 self.history_size)
+        if step is None:
+            step = metric.count
+        value = float(value)
+        metric.append(step, value)
+        if self.filename is not None:
+            self._pending.append((name, step, value))
+            if len(self._pending) >= self.flush_interval:
+                self.flush()
+
+    def recent(self, name):
+        """
+        Steps and values of the recent samples of a metric.
+        """
+        buffer = self.metrics[name].recent
+        return buffer.steps, buffer.values
+
+    def history(self, name):
+        """
+        Steps and values of the downsampled history of a metric.
+        """
+        reservoir = self.metrics[name].history
+        return reservoir.steps, reservoir.values
+
+    def summary(self):
+        """
+        Dictionary of (count, last value, recent mean) for every metric.
+        """
+        return dict((name, (metric.count, metric.last, metric.recent_mean))
+                    for name, metric in self.metrics.items())
+
+    def flush(self):
+        """
+        Write out any samples not yet written to file.
+        """
+        if (self.filename is None) or (not self._pending):
+            return
+        rows, self._pending = self._pending, []
+        if self.filename.endswith(".csv"):
+            new_file = not os.path.exists(self.filename)
+            with open(self.filename, "a", newline="") as csv_file:
+                writer = csv.writer(csv_file)
+                if new_file:
+                    writer.writerow(["metric", "step", "value"])
+                writer.writerows(rows)
+        else:
+            stem = os.path.splitext(self.filename)[0]
+            arrays = dict()
+            for name in set(row[0] for row in rows):
+                chunk = [row for row in rows if row[0] == name]
+                arrays[name+"_steps"] = np.array([row[1] for row in chunk],
+                                                 dtype=np.int64)
+                arrays[name+"_values"] = np.array([row[2] for row in chunk])
+            np.savez("{}.{:05d}.npz".format(stem, self.num_flushes), **arrays)
+        self.num_flushes += 1
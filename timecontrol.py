@@ -0,0 +1,158 @@
+import threading
+import time
+import multiprocessing
+
+from boardgame import BoardgameError, BoardSnapshot
+
+
+class MoveTimeout(BoardgameError):
+    """
+    A player ran out of time without producing a move.
+    """
+
+def _call_move(plyr, board, session):
+    """
+    Ask a player for a move. Module-level so it can run in a worker process.
+    Returns the move and the session, which the player may have changed.
+    """
+    move = plyr.move(board, session)
+    return move, session
+
+
+class MoveScheduler:
+    """
+    Runs each player's move under a deadline, given by the per-move time
+    limit move_time and the per-game allowance game_time (both in seconds,
+    None for no limit).
+
+    With isolation="thread" the move runs in a daemon thread, so a player
+    that hangs is abandoned rather than stalling the game. When time runs out
+    the player's interrupt method is called, which lets anytime players return
+    their best move so far. The abandoned thread is not stopped, and goes on
+    running against the player's session (which interrupt needs to read), so
+    players used with time controls should not change their session once
+    interrupted, or a late move could alter the state seen on their next
+    turn. With isolation="process" the move runs in a worker process which
+    is killed on timeout. The player and its session are pickled for each
+    move, and the session (including the state of the game's random number
+    generator) is copied back afterwards, so players should keep any state
+    they change during a move on the session; changes to the player itself
+    are lost.
+
+    A scheduler keeps the clocks for one game at a time.
+    """
+    def __init__(self, move_time=None, game_time=None, isolation="thread"):
+        """
+        Create the scheduler.
+        """
+        if isolation not in ("thread", "process"):
+            raise ValueError("isolation must be 'thread' or 'process'.")
+        self.move_time = move_time
+        self.game_time = game_time
+        self.isolation = isolation
+        self.time_used = dict()
+        self._pool = None
+
+    def new_game(self):
+        """
+        Reset the clocks.
+        """
+        self.time_used = dict()
+
+    def time_left(self, plyr):
+        """
+        Time allowed for the player's next move, or None if unlimited.
+        """
+        limits = []
+        if self.move_time is not None:
+            limits.append(self.move_time)
+        if self.game_time is not None:
+            limits.append(self.game_time - self.time_used.get(plyr, 0.0))
+        if limits:
+            return max(min(limits), 0.0)
+        return None
+
+    def request_move(self, plyr, board, session=None):
+        """
+        Obtain a move from a player for a copy of board. Raises MoveTimeout if
+        the player runs out of time without a move. Without a time limit the
+        player is given a read-only snapshot of board instead; a move thread
+        can outlive its turn, so it always gets a real copy.
+        """
+        timeout = self.time_left(plyr)
+        start = time.perf_counter()
+        try:
+            if timeout is None:
+                return plyr.move(BoardSnapshot(board), session)
+            elif self.isolation == "thread":
+                return self._thread_move(plyr, board.copy(), session,
+                                         timeout)
+            else:
+                return self._process_move(plyr, board.copy(), session,
+                                          timeout)
+        finally:
+            self.time_used[plyr] = self.time_used.get(plyr, 0.0) \
+                                            + time.perf_counter() - start
+
+    def _thread_move(self, plyr, board, session, timeout):
+        """
+        Run a move in a daemon thread.
+        """
+        result = dict()
+        def target():
+            try:
+                result['move'] = plyr.move(board, session)
+            except Exception as err:
+                result['error'] = err
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if 'error' in result:
+            raise result['error']
+        if 'move' in result:
+            return result['move']
+
+        move = plyr.interrupt(session)
+        if move is None:
+            raise MoveTimeout("Player {} ran out of time.".format(plyr.name))
+        return move
+
+    def _process_move(self, plyr, board, session, timeout):
+        """
+        Run a move in a worker process, killing it if it overruns.
+        """
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(processes=1)
+        pending = self._pool.apply_async(_call_move, (plyr, board, session))
+        try:
+            move, worker_session = pending.get(timeout)
+        except multiprocessing.TimeoutError:
+            self._pool.terminate()
+            self._pool = None
+            raise MoveTimeout("Player {} ran out of time.".format(plyr.name))
+        self._copy_session(worker_session, session)
+        return move
+
+    @staticmethod
+    def _copy_session(source, session):
+        """
+        Copy the state of a session changed in a worker process back into
+        the player's session. The random number generator is shared with
+        the game, so it is advanced in place rather than replaced.
+        """
+        for name, value in source.__dict__.items():
+            if name == "rng":
+                if session.rng is not None:
+                    session.rng.bit_generator.state = \
+                                                value.bit_generator.state
+            else:
+                setattr(session, name, value)
+
+    def close(self):
+        """
+        Shut down any worker process.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
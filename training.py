@@ -0,0 +1,359 @@
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+
+import numpy as np
+
+from boardgame import make_rng, make_seed_sequence, spawn_rngs
+from noughtsandcrosses import NoughtsAndCrossesGame
+from telemetry import Telemetry
+
+
+Evaluation = namedtuple('Evaluation', ['games_trained', 'wins', 'draws',
+                                       'losses'])
+
+def evaluate_player(player, opponent, num_games, random_state=None):
+    """
+    Play a series of games between a (frozen) player and an opponent and
+    return the number of wins, draws and losses from the player's point of
+    view. Each game gets its own random stream spawned from random_state.
+    This is a module-level function so that it can be run in a worker
+    process.
+    """
+    wins = draws = losses = 0
+    for rng in spawn_rngs(random_state, num_games):
+        game = NoughtsAndCrossesGame([player, opponent], verbosity=0, rng=rng)
+        game.play_game()
+        if game.winner == "Draw":
+            draws += 1
+        elif game.winner == opponent.name:
+            losses += 1
+        else:
+            wins += 1
+    return wins, draws, losses
+
+def freeze(player, name=None):
+    """
+    Make a copy of a learning player which no longer learns, optionally
+    under a new name. The copy gets an empty telemetry sink rather than a
+    copy of the player's.
+    """
+    telemetry = player.neural_net.telemetry
+    frozen = deepcopy(player, {id(telemetry): Telemetry()})
+    frozen.learning = False
+    if name is not None:
+        frozen.name = name
+    return frozen
+
+
+class OpponentCurriculum:
+    """
+    A pool of training opponents, which can include frozen snapshots of the
+    learner, sampled according to the learner's recent results against each.
+    With strategy "loss" opponents are weighted by the learner's recent
+    shortfall against them (one minus its mean score, counting a draw as
+    half a win). With strategy "progress" they are weighted by learning
+    progress: the change in mean score between the older and newer halves of
+    the last window games against them. Either way, opponents not yet played
+    get the highest weight, and a fraction exploration of the probability is
+    spread evenly so that no opponent is forgotten.
+    """
+    strategies = ("loss", "progress")
+
+    def __init__(self, opponents, strategy="loss", window=50,
+                 exploration=0.1, snapshot_interval=None, max_snapshots=5):
+        """
+        Create the pool. If snapshot_interval is set, the training scheduler
+        adds a snapshot of the learner every snapshot_interval games, keeping
+        at most max_snapshots of them.
+        """
+        if not opponents:
+            raise ValueError("Must specify at least one training opponent.")
+        if strategy not in self.strategies:
+            raise ValueError("Unknown curriculum strategy '{}'.".format(
+                                                                    strategy))
+        self.strategy = strategy
+        self.window = window
+        self.exploration = exploration
+        self.snapshot_interval = snapshot_interval
+        self.max_snapshots = max_snapshots
+        self.opponents = []
+        self.snapshots = deque([])
+        self._scores = dict()
+        for opponent in opponents:
+            self.add_opponent(opponent)
+
+    def add_opponent(self, opponent):
+        """
+        Add an opponent to the pool.
+        """
+        if opponent.name in self._scores:
+            raise ValueError("There is already an opponent called {}.".format(
+                                                                opponent.name))
+        self.opponents.append(opponent)
+        self._scores[opponent.name] = deque([], maxlen=self.window)
+
+    def remove_opponent(self, opponent):
+        """
+        Remove an opponent from the pool.
+        """
+        self.opponents.remove(opponent)
+        del self._scores[opponent.name]
+
+    def add_snapshot(self, learner, games_trained):
+        """
+        Add a frozen copy of the learner to the pool, retiring the oldest
+        snapshot if there are more than max_snapshots.
+        """
+        snapshot = freeze(learner, "{} (after {} games)".format(learner.name,
+                                                               games_trained))
+        self.add_opponent(snapshot)
+        self.snapshots.append(snapshot)
+        if len(self.snapshots) > self.max_snapshots:
+            self.remove_opponent(self.snapshots.popleft())
+        return snapshot
+
+    def record(self, opponent, result):
+        """
+        Record the result of a game (+1 win, 0 draw, -1 loss for the learner)
+        against an opponent.
+        """
+        scores = self._scores.get(opponent.name)
+        if scores is not None:
+            scores.append((result + 1)/2)
+
+    def priorities(self):
+        """
+        Unnormalised sampling weight of each opponent.
+        """
+        priorities = np.ones(len(self.opponents))
+        for ii, opponent in enumerate(self.opponents):
+            scores = self._scores[opponent.name]
+            if len(scores) < 2:
+                continue
+            if self.strategy == "loss":
+                priorities[ii] = 1 - np.mean(scores)
+            else:
+                half = len(scores)//2
+                recent = list(scores)
+                priorities[ii] = abs(np.mean(recent[half:])
+                                     - np.mean(recent[:half]))
+        return priorities
+
+    def probabilities(self):
+        """
+        Probability of sampling each opponent.
+        """
+        priorities = self.priorities()
+        uniform = np.ones(len(priorities))/len(priorities)
+        total = np.sum(priorities)
+        if total == 0:
+            return uniform
+        return (1 - self.exploration)*priorities/total \
+                                                + self.exploration*uniform
+
+    def sample(self, rng=None):
+        """
+        Pick an opponent for the next training game.
+        """
+        rng = make_rng(rng)
+        return self.opponents[rng.choice(len(self.opponents),
+                                          p=self.probabilities())]
+
+    def __repr__(self):
+        return ", ".join("{}: {:.2f}".format(opponent.name, prob)
+                         for opponent, prob in zip(self.opponents,
+                                                   self.probabilities()))
+
+
+class TrainingScheduler:
+    """
+    Training driver for a learning player. Every eval_interval training games
+    a frozen copy of the learner is evaluated against a fixed opponent in a
+    background worker process, so evaluation overlaps with training. Training
+    stops when the loss rate reaches target_loss_rate, when the evaluation
+    score (win rate minus loss rate) has not improved for patience
+    evaluations, or after max_games training games.
+
+    Every training game and evaluation gets its own random stream spawned
+    from random_state, so runs are reproducible whatever the number of
+    workers.
+
+    opponents is either a list, played in turn, or an OpponentCurriculum,
+    which picks each opponent from the learner's recent results and is
+    given frozen snapshots of the learner as training goes on.
+
+    The result of every training game (+1/0/-1 for the learner) and the
+    score of every evaluation are recorded in telemetry, which defaults to
+    the learner's net's, alongside its training cost.
+    """
+    def __init__(self,
+                 player,
+                 opponents,
+                 evaluation_opponent,
+                 eval_interval=100,
+                 num_eval_games=100,
+                 max_games=100000,
+                 target_loss_rate=0.0,
+                 patience=10,
+                 min_improvement=0.0,
+                 num_workers=2,
+                 verbosity=1,
+                 random_state=None,
+                 telemetry=None,
+                 ):
+        """
+        Set up the scheduler.
+        """
+        if not opponents:
+            raise ValueError("Must specify at least one training opponent.")
+
+        self.player = player
+        self.opponents = opponents
+        if isinstance(opponents, OpponentCurriculum):
+            self.curriculum = opponents
+        else:
+            self.curriculum = None
+        self.evaluation_opponent = evaluation_opponent
+        self.eval_interval = eval_interval
+        self.num_eval_games = num_eval_games
+        self.max_games = max_games
+        self.target_loss_rate = target_loss_rate
+        self.patience = patience
+        self.min_improvement = min_improvement
+        self.num_workers = num_workers
+        self.verbosity = verbosity
+        self.seed_sequence = make_seed_sequence(random_state)
+        if telemetry is None:
+            telemetry = player.neural_net.telemetry
+        self.telemetry = telemetry
+
+        self.evaluations = []
+        self.best_player = None
+        self.best_score = None
+        self.stop_reason = None
+        self.games_trained = 0
+        self._since_best = 0
+
+    def _announce(self, message, v=1):
+        """
+        Make an announcement
+        """
+        if (v <= self.verbosity):
+            print(message)
+
+    def _snapshot(self):
+        """
+        Make a frozen copy of the learner for evaluation.
+        """
+        return freeze(self.player)
+
+    def _record(self, games_trained, frozen, result):
+        """
+        Record an evaluation result and check the stopping criteria. Returns
+        True if training should stop.
+        """
+        wins, draws, losses = result
+        evaluation = Evaluation(games_trained, wins, draws, losses)
+        self.evaluations.append(evaluation)
+        loss_rate = losses/self.num_eval_games
+        score = (wins - losses)/self.num_eval_games
+        self.telemetry.record("eval_score", score, step=games_trained)
+        self._announce("After {} games: won {}, drew {}, lost {} of {} "
+                       "evaluation games.".format(games_trained, wins, draws,
+                                                  losses, self.num_eval_games))
+        if "cost" in self.telemetry:
+            self._announce("Recent mean cost {:.4f}.".format(
+                                self.telemetry["cost"].recent_mean), v=2)
+
+        if (self.best_score is None) or \
+                        (score > self.best_score + self.min_improvement):
+            self.best_score = score
+            self.best_player = frozen
+            self._since_best = 0
+        else:
+            self._since_best += 1
+
+        if loss_rate <= self.target_loss_rate:
+            self.best_player = frozen
+            self.stop_reason = "target"
+            return True
+        if self._since_best >= self.patience:
+            self.stop_reason = "plateau"
+            return True
+        return False
+
+    def run(self):
+        """
+        Train until a stopping criterion is met. Returns the list of
+        evaluations.
+        """
+        pending = deque([])
+        stop = False
+        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+            while (not stop) and (self.games_trained < self.max_games):
+                rng, = spawn_rngs(self.seed_sequence, 1)
+                if self.curriculum is not None:
+                    opponent = self.curriculum.sample(rng)
+                else:
+                    opponent = self.opponents[
+                                    self.games_trained % len(self.opponents)]
+                game = NoughtsAndCrossesGame([self.player, opponent],
+                                             verbosity=0, rng=rng)
+                game.play_game()
+                self.games_trained += 1
+                result = (game.winner == self.player.name) \
+                                            - (game.winner == opponent.name)
+                self.telemetry.record("result", result,
+                                      step=self.games_trained)
+                if self.curriculum is not None:
+                    self._update_curriculum(opponent, result)
+
+                if (self.games_trained % self.eval_interval) == 0:
+                    # Only block if every worker is already busy
+                    if len(pending) >= self.num_workers:
+                        stop = self._collect(pending.popleft())
+                    if not stop:
+                        frozen = self._snapshot()
+                        eval_seed, = self.seed_sequence.spawn(1)
+                        future = executor.submit(evaluate_player, frozen,
+                                                 self.evaluation_opponent,
+                                                 self.num_eval_games,
+                                                 eval_seed)
+                        pending.append((self.games_trained, frozen, future))
+
+                # Pick up any evaluations that have finished
+                while (not stop) and pending and pending[0][2].done():
+                    stop = self._collect(pending.popleft())
+
+            # Results still outstanding at the end may yet trigger a stop
+            while (not stop) and pending:
+                stop = self._collect(pending.popleft())
+            for _, _, future in pending:
+                future.cancel()
+
+        self.telemetry.flush()
+        if self.stop_reason is None:
+            self.stop_reason = "max_games"
+        self._announce("Training stopped after {} games ({}).".format(
+                                        self.games_trained, self.stop_reason))
+        return self.evaluations
+
+    def _update_curriculum(self, opponent, result):
+        """
+        Pass a training game result to the curriculum, and give it a new
+        snapshot of the learner when one is due.
+        """
+        self.curriculum.record(opponent, result)
+        interval = self.curriculum.snapshot_interval
+        if (interval is not None) and (self.games_trained % interval == 0):
+            self.curriculum.add_snapshot(self.player, self.games_trained)
+            self._announce("Opponent probabilities: {}".format(
+                                                        self.curriculum), v=2)
+
+    def _collect(self, entry):
+        """
+        Wait for a pending evaluation and record it.
+        """
+        games_trained, frozen, future = entry
+        return self._record(games_trained, frozen, future.result())
@@ -0,0 +1,232 @@
+import numpy as np
+
+from boardgame import BoardgameError
+from noughtsandcrosses import NoughtsAndCrossesBoard, NoughtsAndCrossesGame
+
+
+# Bit masks of the rows, columns and diagonals of a 3x3 grid (cell i is bit i)
+LINE_MASKS = [sum(1 << int(cc) for cc in line)
+                                    for line in NoughtsAndCrossesBoard.lines]
+
+# Whether each 9-bit mask of occupied cells contains a complete line
+WIN_TABLE = tuple(any((mask & line) == line for line in LINE_MASKS)
+                                                    for mask in range(512))
+
+FULL = 0x1FF
+
+# The cells set in each 9-bit mask
+MASK_CELLS = tuple(tuple(cc for cc in range(9) if (mask >> cc) & 1)
+                                                    for mask in range(512))
+
+
+class UltimateNoughtsAndCrossesBoard:
+    """
+    An ultimate noughts and crosses board: a 3x3 grid of noughts and crosses
+    sub-boards. Moves are numbered 9*sub_board + cell. A move in a cell sends
+    the opponent to the sub-board in the same position, unless that sub-board
+    is already won or full, in which case they may play in any open
+    sub-board. Winning a sub-board claims it on the meta-board, and the game
+    is won by claiming a line of sub-boards.
+
+    The position is held as a 9-bit mask of each side's marks for each
+    sub-board, plus meta-board masks of the sub-boards each side has won and
+    of those which are closed, so moves and result checks are a few integer
+    operations and table lookups.
+    """
+    marks = NoughtsAndCrossesBoard.marks
+    max_moves = 81
+
+    def __init__(self):
+        """
+        Create the board
+        """
+        self.masks = {1: [0]*9, -1: [0]*9}
+        self.meta = {1: 0, -1: 0}
+        self.closed = 0
+        self.next_sub_board = None
+        self.turn = 1
+        self.over = False
+        self.winner = None
+        self._history = []
+
+    def copy(self):
+        """
+        Copy the board.
+        """
+        new = UltimateNoughtsAndCrossesBoard.__new__(
+                                            UltimateNoughtsAndCrossesBoard)
+        new.masks = {1: list(self.masks[1]), -1: list(self.masks[-1])}
+        new.meta = dict(self.meta)
+        new.closed = self.closed
+        new.next_sub_board = self.next_sub_board
+        new.turn = self.turn
+        new.over = self.over
+        new.winner = self.winner
+        new._history = list(self._history)
+        return new
+
+    @property
+    def state(self):
+        """
+        The board as a 9x9 int8 array of +1/-1/0, laid out as it is drawn.
+        """
+        state = np.zeros((9,9), dtype=np.int8)
+        for side in (1, -1):
+            for sub in range(9):
+                for cc in MASK_CELLS[self.masks[side][sub]]:
+                    state[3*(sub//3) + cc//3, 3*(sub%3) + cc%3] = side
+        return state
+
+    def sub_board(self, sub):
+        """
+        A NoughtsAndCrossesBoard copy of one sub-board, e.g. for analysis.
+        """
+        board = NoughtsAndCrossesBoard()
+        for side in (1, -1):
+            for cc in MASK_CELLS[self.masks[side][sub]]:
+                board.state.flat[cc] = side
+        board.turn = self.turn
+        board.over = bool((self.closed >> sub) & 1)
+        return board
+
+    def display_board(self):
+        """
+        Display the board at the command line.
+        """
+        entries = self.marks[self.state]
+        rows = []
+        for rr in range(9):
+            if rr in (3, 6):
+                rows.append("------+-------+------")
+            row = entries[rr]
+            rows.append(" | ".join(" ".join(row[3*bb:3*bb+3])
+                                                        for bb in range(3)))
+        print("\n" + "\n".join(rows) + "\n")
+
+    def _open_sub_boards(self):
+        """
+        The sub-boards in which the player to move may play.
+        """
+        if self.next_sub_board is not None:
+            return (self.next_sub_board,)
+        return MASK_CELLS[FULL & ~self.closed]
+
+    @property
+    def permitted_moves(self):
+        """
+        Returns a list of legal moves
+        """
+        if self.over:
+            return []
+        moves = []
+        for sub in self._open_sub_boards():
+            free = FULL & ~(self.masks[1][sub] | self.masks[-1][sub])
+            moves.extend(9*sub + cc for cc in MASK_CELLS[free])
+        return np.array(moves)
+
+    def winning_moves(self, side):
+        """
+        Returns the legal moves (for the player to move) in which side would
+        win the game.
+        """
+        if self.over:
+            return np.array([], dtype=int)
+        moves = []
+        for sub in self._open_sub_boards():
+            if not WIN_TABLE[self.meta[side] | (1 << sub)]:
+                continue
+            own = self.masks[side][sub]
+            free = FULL & ~(own | self.masks[-side][sub])
+            moves.extend(9*sub + cc for cc in MASK_CELLS[free]
+                                            if WIN_TABLE[own | (1 << cc)])
+        return np.array(moves, dtype=int)
+
+    def verify(self, move):
+        """
+        Verify that a move is valid
+        """
+        if self.over:
+            return False
+        try:
+            sub, cell = divmod(int(move), 9)
+        except (TypeError, ValueError):
+            return False
+        if not ((0 <= sub < 9) and (sub in self._open_sub_boards())):
+            return False
+        occupied = self.masks[1][sub] | self.masks[-1][sub]
+        return not ((occupied >> cell) & 1)
+
+    def move(self, move):
+        """
+        Make a move
+        """
+        if self.over:
+            raise BoardgameError("The game is over")
+        if not self.verify(move):
+            raise BoardgameError("That move is not valid")
+
+        sub, cell = divmod(int(move), 9)
+        side = self.turn
+        self._history.append((sub, cell, self.next_sub_board))
+        self.masks[side][sub] |= 1 << cell
+        self._update_sub_board(sub)
+
+        if WIN_TABLE[self.meta[side]]:
+            self.over = True
+            self.winner = side
+        elif self.closed == FULL:
+            self.over = True
+            self.winner = 0
+
+        if self.over:
+            self.turn = 0
+            self.next_sub_board = None
+        else:
+            self.turn = -side
+            if (self.closed >> cell) & 1:
+                self.next_sub_board = None
+            else:
+                self.next_sub_board = cell
+
+    def unmove(self, move):
+        """
+        Take back the last move.
+        """
+        if not self._history:
+            raise BoardgameError("There is no move to take back")
+        sub, cell, next_sub_board = self._history[-1]
+        if 9*sub + cell != move:
+            raise BoardgameError("Only the last move can be taken back")
+        self._history.pop()
+        side = 1 if (self.masks[1][sub] >> cell) & 1 else -1
+        self.masks[side][sub] &= ~(1 << cell)
+        self._update_sub_board(sub)
+        self.next_sub_board = next_sub_board
+        self.over = False
+        self.winner = None
+        self.turn = side
+
+    def _update_sub_board(self, sub):
+        """
+        Recompute whether a sub-board is won or full.
+        """
+        bit = 1 << sub
+        self.meta[1] &= ~bit
+        self.meta[-1] &= ~bit
+        self.closed &= ~bit
+        for side in (1, -1):
+            if WIN_TABLE[self.masks[side][sub]]:
+                self.meta[side] |= bit
+                self.closed |= bit
+        if (self.masks[1][sub] | self.masks[-1][sub]) == FULL:
+            self.closed |= bit
+
+
+class UltimateNoughtsAndCrossesGame(NoughtsAndCrossesGame):
+    """
+    Ultimate noughts and crosses game. Works with any player which only uses
+    the generic board interface (permitted_moves, winning_moves), such as
+    DumbNoughtsAndCrossesPlayer and NaiveNoughtsAndCrossesPlayer.
+    """
+    game_name = "Ultimate Noughts & Crosses"
+    board_class = UltimateNoughtsAndCrossesBoard